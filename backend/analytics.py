@@ -0,0 +1,221 @@
+"""
+Nightly batch analytics over every stored family tree.
+
+Tree documents are streamed from MongoDB with a cursor and fanned out to a
+process pool, each with the op log entries saved after its checkpoint.
+Each worker hydrates its tree from the binary snapshot (or the legacy JSON
+dict) plus those entries, runs the configured checks and returns a small
+summary; summaries are upserted into the analytics collection in bulk.
+
+Usage:
+    python analytics.py --workers 8 --checks members,cycles,depth,orphans,connectivity
+"""
+from __future__ import annotations
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+import argparse
+import os
+
+from family_tree import FamilyTree
+from oplog import replay_entries, stored_checkpoint, stored_versions, ops_after_checkpoint
+
+
+# === Checks ===
+def check_members(tree: FamilyTree) -> Dict[str, Any]:
+    return {
+        "members": len(tree.persons),
+        "edges": sum(len(rels) for rels in tree.graph.values()),
+    }
+
+
+def check_cycles(tree: FamilyTree) -> Dict[str, Any]:
+    cycles = tree.detect_ancestry_cycles()
+    return {"cycle_count": len(cycles), "cycles": cycles[:10]}
+
+
+def check_depth(tree: FamilyTree) -> Dict[str, Any]:
+    """Longest chain of parent links (number of generations) in the tree."""
+    depth: Dict[str, int] = {}
+    for root in tree.persons:
+        if root in depth:
+            continue
+        # Iterative post-order DFS over parent links; cycles are cut at the back edge
+        on_path = {root}
+        stack = [(root, iter(tree._get_by_relationship(root, 13)))]
+        while stack:
+            mid, parents = stack[-1]
+            advanced = False
+            for parent in parents:
+                if parent in depth or parent in on_path or parent not in tree.persons:
+                    continue
+                on_path.add(parent)
+                stack.append((parent, iter(tree._get_by_relationship(parent, 13))))
+                advanced = True
+                break
+            if advanced:
+                continue
+            stack.pop()
+            on_path.discard(mid)
+            depth[mid] = 1 + max(
+                (depth[p] for p in tree._get_by_relationship(mid, 13) if p in depth),
+                default=0,
+            )
+    return {"generation_depth": max(depth.values(), default=0)}
+
+
+def check_orphans(tree: FamilyTree) -> Dict[str, Any]:
+    """Members without any relationship, and edges pointing at missing members."""
+    linked = set()
+    dangling = 0
+    for mid1, rels in tree.graph.items():
+        for mid2 in rels:
+            if mid1 in tree.persons and mid2 in tree.persons:
+                linked.add(mid1)
+                linked.add(mid2)
+            else:
+                dangling += 1
+    isolated = [mid for mid in tree.persons if mid not in linked]
+    return {"orphan_count": len(isolated), "orphans": isolated[:50], "dangling_edges": dangling}
+
+
+def check_connectivity(tree: FamilyTree) -> Dict[str, Any]:
+    """Number of connected components when every relationship is treated as undirected."""
+    adjacency: Dict[str, set] = {mid: set() for mid in tree.persons}
+    for mid1, rels in tree.graph.items():
+        for mid2 in rels:
+            if mid1 in adjacency and mid2 in adjacency:
+                adjacency[mid1].add(mid2)
+                adjacency[mid2].add(mid1)
+    seen = set()
+    sizes = []
+    for start in adjacency:
+        if start in seen:
+            continue
+        seen.add(start)
+        stack = [start]
+        size = 0
+        while stack:
+            curr = stack.pop()
+            size += 1
+            for neighbor in adjacency[curr]:
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    stack.append(neighbor)
+        sizes.append(size)
+    return {"components": len(sizes), "largest_component": max(sizes, default=0)}
+
+
+CHECKS: Dict[str, Callable[[FamilyTree], Dict[str, Any]]] = {
+    "members": check_members,
+    "cycles": check_cycles,
+    "depth": check_depth,
+    "orphans": check_orphans,
+    "connectivity": check_connectivity,
+}
+
+
+# === Worker ===
+def hydrate(doc: Dict[str, Any]) -> FamilyTree:
+    """The current tree: the document's checkpoint with its attached "ops" replayed."""
+    base, version = stored_versions(doc)
+    ops = doc.get("ops") or []
+    if len(ops) != version - base:
+        raise ValueError(f"Op log has {len(ops)} of the {version - base} entries after version {base}.")
+    return replay_entries(stored_checkpoint(doc), ops)
+
+
+def with_ops(doc: Dict[str, Any], ops_collection) -> Dict[str, Any]:
+    """Attach the op log entries written after the document's checkpoint as doc["ops"]."""
+    base, version = stored_versions(doc)
+    if version > base:
+        doc["ops"] = list(ops_collection.find(
+            ops_after_checkpoint(doc), {"_id": 0, "version": 1, "changes": 1}
+        ).sort("version", 1))
+    return doc
+
+
+def analyze_document(doc: Dict[str, Any], checks: List[str]) -> Dict[str, Any]:
+    """Run the named checks on one tree document. Executed in a worker process."""
+    result: Dict[str, Any] = {"username": doc["username"]}
+    try:
+        tree = hydrate(doc)
+        for name in checks:
+            result.update(CHECKS[name](tree))
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def analyze_documents(docs: Iterable[Dict[str, Any]], checks: List[str], workers: Optional[int] = None,
+                      max_in_flight: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one result per document, in completion order. At most
+    max_in_flight documents are held in memory at once, so the cursor is
+    consumed only as fast as the pool drains it.
+    """
+    unknown = [c for c in checks if c not in CHECKS]
+    if unknown:
+        raise ValueError(f"Unknown checks: {', '.join(unknown)}")
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for doc in docs:
+            pending.add(pool.submit(analyze_document, doc, checks))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+
+def run(trees_collection, ops_collection, results_collection, checks: List[str], workers: Optional[int] = None,
+        batch_size: int = 500) -> Dict[str, int]:
+    """Analyze every tree in trees_collection and upsert results by username."""
+    from pymongo import UpdateOne
+
+    cursor = trees_collection.find(
+        {}, {"username": 1, "tree_snapshot": 1, "tree": 1, "tree_version": 1, "checkpoint_version": 1, "_id": 0},
+        batch_size=batch_size
+    )
+    docs = (with_ops(doc, ops_collection) for doc in cursor)
+    run_at = datetime.now(timezone.utc)
+    totals = {"trees": 0, "errors": 0}
+    ops = []
+    for result in analyze_documents(docs, checks, workers=workers):
+        totals["trees"] += 1
+        if "error" in result:
+            totals["errors"] += 1
+        result["run_at"] = run_at
+        ops.append(UpdateOne({"username": result["username"]}, {"$set": result}, upsert=True))
+        if len(ops) >= batch_size:
+            results_collection.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        results_collection.bulk_write(ops, ordered=False)
+    return totals
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Run batch analytics over all stored family trees.")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--db", default="family_tree_db")
+    parser.add_argument("--results-collection", default="tree_analytics")
+    parser.add_argument("--checks", default=",".join(CHECKS), help="comma-separated subset of: " + ", ".join(CHECKS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    db = MongoClient(args.mongo_uri)[args.db]
+    checks = [c.strip() for c in args.checks.split(",") if c.strip()]
+    totals = run(db["trees"], db["tree_ops"], db[args.results_collection], checks,
+                 workers=args.workers, batch_size=args.batch_size)
+    print(f"Analyzed {totals['trees']} trees ({totals['errors']} errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,22 @@ import os
 import hashlib
 import uuid
 import json
+import time
 from datetime import timedelta
-from flask import Flask, request, jsonify, send_file
+from functools import wraps
+from flask import Flask, request, jsonify, send_file, g, Response
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from pymongo import MongoClient
-from family_tree import Person, FamilyTree
+from pymongo import MongoClient, monitoring
+from pymongo.errors import BulkWriteError, PyMongoError
+from family_tree import Person, FamilyTree, TraversalLimits, RELATIONSHIP_LABELS_INV
+import snapshot
+import serialize
+from locking import LockRegistry
+from jobs import JobPool, PoolBusyError, QueryTimeoutError
+from metrics import metrics, SamplingProfiler
+from changelog import changed_since, build_delta
+from oplog import OpLog, rebuild, entry_mids, stored_versions, stored_checkpoint, ops_after_checkpoint
 import csv
 import io
 import tempfile
@@ -15,15 +25,284 @@ import tempfile
 app = Flask(__name__)
 app.config["JWT_SECRET_KEY"] = "your-secret-key"
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=24)
+app.config["HEAVY_QUERY_TIMEOUT"] = 10  # seconds an interactive heavy query may run
+app.config["HEAVY_QUERY_WORKERS"] = 4  # threads for interactive heavy queries
+app.config["HEAVY_QUERY_MAX_PENDING"] = 32
+app.config["JOB_WORKERS"] = 2  # separate threads for /jobs, so big jobs never starve interactive queries
+app.config["JOB_MAX_PENDING"] = 8
+app.config["JOB_RESULT_TTL"] = 600  # seconds a finished job's result waits to be collected
+app.config["KINSHIP_MATRIX_MAX_MEMBERS"] = 200  # the matrix runs one path search per ordered pair
+app.config["PROFILE_SAMPLE_RATE"] = 0.0  # fraction of requests to run under cProfile
+app.config["PROFILE_SLOW_SECONDS"] = 1.0  # keep profiles of sampled requests slower than this
+app.config["OPLOG_CHECKPOINT_INTERVAL"] = 100  # operations between stored snapshot checkpoints
+app.config["OPLOG_KEEP_CHECKPOINTS"] = 5  # stored checkpoints kept per tree; older history is pruned
+app.config["OPLOG_ORPHAN_SECONDS"] = 60  # uncommitted op rows older than this belong to a dead save
+app.config["COMPRESS_MIN_BYTES"] = 4096  # compress JSON bodies at least this large
+app.config["COMPRESS_LEVEL"] = 5  # gzip level; 1 is ~2x cheaper, 6+ barely smaller
 
 CORS(app, resources={r"/*": {"origins": "*"}})
 jwt = JWTManager(app)
 
-client = MongoClient('mongodb://localhost:27017/')
+class DbMetricsListener(monitoring.CommandListener):
+    """Counts MongoDB round trips and their latency."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        metrics.inc("db_round_trips_total", command=event.command_name)
+        metrics.observe("db_command_duration_seconds", event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        metrics.inc("db_round_trips_total", command=event.command_name)
+        metrics.observe("db_command_duration_seconds", event.duration_micros / 1e6, command=event.command_name)
+
+def observe_traversal(name, visited):
+    metrics.observe("traversal_nodes_visited", visited, traversal=name)
+
+FamilyTree.traversal_observer = observe_traversal
+
+def observe_checkpoint(seconds):
+    metrics.observe("tree_stage_duration_seconds", seconds, stage="checkpoint")
+
+OpLog.checkpoint_observer = observe_checkpoint
+profiler = SamplingProfiler(app.config["PROFILE_SAMPLE_RATE"], app.config["PROFILE_SLOW_SECONDS"])
+
+client = MongoClient('mongodb://localhost:27017/', event_listeners=[DbMetricsListener()])
 db = client['family_tree_db']
 trees_collection = db['trees']
+ops_collection = db['tree_ops']
+checkpoints_collection = db['tree_checkpoints']
+_oplog_indexes_ready = False
+
+def ensure_oplog_indexes():
+    global _oplog_indexes_ready
+    if not _oplog_indexes_ready:
+        # The unique index is what makes two workers appending the same version collide
+        ops_collection.create_index([("username", 1), ("version", 1)], unique=True)
+        checkpoints_collection.create_index([("username", 1), ("version", -1)])
+        _oplog_indexes_ready = True
 
 user_trees = {}
+user_tree_versions = {}
+tree_oplogs = {}
+tree_locks = LockRegistry()
+
+def tree_lock(mode):
+    """Hold the current user's tree lock in 'read' or 'write' mode for the whole request."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            lock = tree_locks.get(get_jwt_identity())
+            ctx = lock.write_locked() if mode == "write" else lock.read_locked()
+            with ctx:
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+heavy_pool = JobPool(max_workers=app.config["HEAVY_QUERY_WORKERS"], max_pending=app.config["HEAVY_QUERY_MAX_PENDING"],
+                     name="tree-query")
+job_pool = JobPool(max_workers=app.config["JOB_WORKERS"], max_pending=app.config["JOB_MAX_PENDING"],
+                   result_ttl=app.config["JOB_RESULT_TTL"])
+
+def run_heavy_query(fn):
+    """
+    Run a read-only tree query on the heavy pool under the current user's read
+    lock. The lock is taken inside the task so that a query which outlives its
+    timeout still cannot race with a later write.
+    """
+    lock = tree_locks.get(get_jwt_identity())
+    # A sampled request's profile only sees its own thread; profile the worker too
+    active_profiler = g.get('profiler')
+    def task():
+        with lock.read_locked(), metrics.timer("tree_stage_duration_seconds", stage="query"):
+            if active_profiler is not None:
+                return profiler.run_in_thread(active_profiler, fn)
+            return fn()
+    return heavy_pool.run(task, timeout=app.config["HEAVY_QUERY_TIMEOUT"])
+
+def load_history(user_doc):
+    """
+    Hydrate a FamilyTree and its OpLog from a user document: the latest
+    checkpoint snapshot, then every logged operation written after it.
+    """
+    user_doc = user_doc or {}
+    base, version = stored_versions(user_doc)
+    with metrics.timer("tree_stage_duration_seconds", stage="hydrate"):
+        tree = stored_checkpoint(user_doc)
+        checkpoint = bytes(user_doc['tree_snapshot']) if user_doc.get('tree_snapshot') else snapshot.dumps(tree)
+        # Without checkpoint_version the document predates the op log: its
+        # snapshot (or JSON tree) is stored nowhere the op log can rebuild from
+        oplog = OpLog(base, checkpoint, checkpoint_interval=app.config["OPLOG_CHECKPOINT_INTERVAL"],
+                      keep_checkpoints=app.config["OPLOG_KEEP_CHECKPOINTS"],
+                      checkpoint_stored='checkpoint_version' in user_doc)
+        if version > base:
+            entries = ops_collection.find(
+                ops_after_checkpoint(user_doc), {"_id": 0, "username": 0}
+            ).sort("version", 1)
+            for entry in entries:
+                oplog.replay(tree, entry)
+        tree.take_dirty()
+    return tree, oplog
+
+def load_tree(user_doc):
+    return load_history(user_doc)[0]
+
+class StaleTreeError(Exception):
+    """Raised when another worker saved the tree after this worker loaded it."""
+
+def _version_filter(username, version):
+    if version == 0:
+        # Documents written before version stamps existed have no field yet
+        return {"username": username, "$or": [{"tree_version": 0}, {"tree_version": {"$exists": False}}]}
+    return {"username": username, "tree_version": version}
+
+def _drop_cached_tree(username):
+    # Our in-memory copy holds an unpersisted mutation; drop it
+    user_trees.pop(username, None)
+    user_tree_versions.pop(username, None)
+    tree_oplogs.pop(username, None)
+
+def _committed_by(username, writer):
+    doc = trees_collection.find_one({"username": username}, {"tree_writer": 1})
+    return doc is not None and doc.get("tree_writer") == writer
+
+def _discard_orphans(username):
+    """
+    Remove op and checkpoint rows above the committed version that a save
+    left behind when its process died; they would make every later save of
+    those versions collide. Recent rows may still belong to a live save.
+    """
+    doc = trees_collection.find_one({"username": username}, {"tree_version": 1}) or {}
+    query = {
+        "username": username,
+        "version": {"$gt": doc.get("tree_version", 0)},
+        "saved_at": {"$lt": time.time() - app.config["OPLOG_ORPHAN_SECONDS"]},
+    }
+    ops_collection.delete_many(query)
+    checkpoints_collection.delete_many(query)
+
+def _abandon_save(username, writer, collided):
+    """Undo what a failed save wrote and forget the cached tree it could not persist."""
+    _drop_cached_tree(username)
+    try:
+        if not _committed_by(username, writer):
+            ops_collection.delete_many({"username": username, "writer": writer})
+            checkpoints_collection.delete_many({"username": username, "writer": writer})
+        if collided:
+            _discard_orphans(username)
+    except PyMongoError:
+        pass  # unreachable database; a later collision sweeps the rows once they are old enough
+
+def prune_history(username):
+    """
+    Delete stored checkpoints older than the newest OPLOG_KEEP_CHECKPOINTS,
+    and the ops at or below the oldest one kept, which no rebuild can reach.
+    """
+    kept = list(checkpoints_collection.find(
+        {"username": username}, {"version": 1, "_id": 0}
+    ).sort("version", -1).limit(app.config["OPLOG_KEEP_CHECKPOINTS"]))
+    if len(kept) < app.config["OPLOG_KEEP_CHECKPOINTS"]:
+        return
+    oldest = kept[-1]["version"]
+    checkpoints_collection.delete_many({"username": username, "version": {"$lt": oldest}})
+    ops_collection.delete_many({"username": username, "version": {"$lte": oldest}})
+
+def save_tree(username, tree):
+    """
+    Append the operations logged since the last save to the op log
+    collection and move the shared version stamp to the last of them,
+    together with the newest snapshot checkpoint if one was taken.
+    A concurrent writer in another process is detected either by the unique
+    (username, version) index or by the stamp no longer matching the
+    version this worker loaded. Rows are tagged with a per-save writer id so
+    a save that fails part way removes exactly what it wrote.
+    """
+    oplog = tree_oplogs[username]
+    version = user_tree_versions.get(username, 0)
+    entries = oplog.unpersisted()
+    if not entries:
+        return
+    checkpoints = oplog.pending_checkpoints()
+    writer = uuid.uuid4().hex
+    saved_at = time.time()
+    update = {"$set": {"tree_version": oplog.version, "tree_writer": writer}}
+    if checkpoints:
+        latest = max(checkpoints)
+        update["$set"].update({"tree_snapshot": checkpoints[latest], "checkpoint_version": latest})
+        # A legacy JSON tree is only dropped together with the checkpoint replacing it
+        update["$unset"] = {"tree": ""}
+    with metrics.timer("tree_stage_duration_seconds", stage="db_write"):
+        try:
+            ensure_oplog_indexes()
+            ops_collection.insert_many([
+                dict(entry, username=username, members=entry_mids(entry), writer=writer, saved_at=saved_at)
+                for entry in entries
+            ])
+            if checkpoints:
+                checkpoints_collection.insert_many([
+                    {"username": username, "version": v, "snapshot": data, "writer": writer, "saved_at": saved_at}
+                    for v, data in sorted(checkpoints.items())
+                ])
+            result = trees_collection.update_one(_version_filter(username, version), update)
+            if result.matched_count == 0:
+                raise StaleTreeError(username)
+        except Exception as error:
+            collided = isinstance(error, BulkWriteError)
+            _abandon_save(username, writer, collided)
+            if collided:
+                raise StaleTreeError(username) from error
+            raise
+    oplog.mark_persisted()
+    user_tree_versions[username] = oplog.version
+    tree.take_dirty()
+    if checkpoints:
+        try:
+            prune_history(username)
+        except PyMongoError:
+            pass  # the save itself landed; the next checkpoint retries the pruning
+
+def current_oplog():
+    """Op log of the tree get_current_user_tree() returned; every mutation goes through it."""
+    return tree_oplogs[get_jwt_identity()]
+
+@app.errorhandler(StaleTreeError)
+def stale_tree_handler(error):
+    return jsonify({"msg": "Tree was modified by another request, please retry"}), 409
+
+@app.errorhandler(PoolBusyError)
+def pool_busy_handler(error):
+    return jsonify({"msg": "Server is busy, please retry later"}), 503
+
+@app.errorhandler(QueryTimeoutError)
+def query_timeout_handler(error):
+    return jsonify({"msg": "Query timed out"}), 504
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profiler = profiler.start()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe("http_request_duration_seconds", elapsed,
+                    route=route, method=request.method, status=response.status_code)
+    active_profiler = g.pop('profiler', None)
+    if active_profiler is not None:
+        profiler.stop(active_profiler, f"{request.method} {route}", elapsed)
+    return response
+
+@app.teardown_request
+def release_profiler(error):
+    # after_request is skipped on unhandled errors; never leave the profiler attached
+    active_profiler = g.pop('profiler', None)
+    if active_profiler is not None:
+        profiler.stop(active_profiler, request.method + " " + request.path, 0.0)
 
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
@@ -51,34 +330,40 @@ def register():
     if existing_user:
         return jsonify({"msg": "Username already exists"}), 400
     
+    empty = snapshot.dumps(FamilyTree())
     new_user = {
         "username": username,
         "password": password,
         "email": email,
-        "tree": FamilyTree().to_dict()
+        "tree_snapshot": empty,
+        "tree_version": 0,
+        "checkpoint_version": 0
     }
 
     trees_collection.insert_one(new_user)
+    checkpoints_collection.insert_one({"username": username, "version": 0, "snapshot": empty})
     return jsonify({"msg": "User registered successfully"}), 201
 
 @app.route('/login', methods=['POST'])
 def login():
-        data = request.get_json()
+    data = request.get_json()
     username = data.get('username')
     password = data.get('password')
-        
-        if not username or not password:
+    
+    if not username or not password:
         return jsonify({"msg": "Username and password required"}), 400
     
     user = trees_collection.find_one({"username": username, "password": password})
     if not user:
         return jsonify({"msg": "Invalid credentials"}), 401
     
-        access_token = create_access_token(identity=username)
+    access_token = create_access_token(identity=username)
     
-    tree = FamilyTree()
-    tree.from_dict(user.get('tree', {}))
-    user_trees[username] = tree
+    tree, oplog = load_history(user)
+    with tree_locks.get(username).write_locked():
+        user_trees[username] = tree
+        user_tree_versions[username] = user.get('tree_version', 0)
+        tree_oplogs[username] = oplog
     
     return jsonify({
         "access_token": access_token,
@@ -86,26 +371,199 @@ def login():
     }), 200
 
 def get_current_user_tree():
-    username = get_jwt_identity()
-    if username not in user_trees:
-        user = trees_collection.find_one({"username": username})
-        if user:
-            tree = FamilyTree()
-            tree.from_dict(user.get('tree', {}))
-            user_trees[username] = tree
-        else:
-            user_trees[username] = FamilyTree()
+    return get_user_tree(get_jwt_identity())
+
+def get_user_tree(username):
+    """
+    Return the cached tree for a user, reloading it only when the stored
+    version stamp differs from the cached one (another worker wrote it).
+    """
+    if username in user_trees:
+        with metrics.timer("tree_stage_duration_seconds", stage="version_check"):
+            stamp = trees_collection.find_one({"username": username}, {"tree_version": 1, "_id": 0})
+        if stamp is not None and stamp.get('tree_version', 0) == user_tree_versions.get(username):
+            metrics.inc("tree_cache_requests_total", result="hit")
+            return user_trees[username]
+        metrics.inc("tree_cache_requests_total", result="stale")
+    else:
+        metrics.inc("tree_cache_requests_total", result="miss")
+    user = trees_collection.find_one({"username": username})
+    if user:
+        user_trees[username], tree_oplogs[username] = load_history(user)
+        user_tree_versions[username] = user.get('tree_version', 0)
+    else:
+        user_trees[username] = FamilyTree()
+        user_tree_versions[username] = 0
+        tree_oplogs[username] = OpLog(0, snapshot.dumps(user_trees[username]),
+                                      checkpoint_interval=app.config["OPLOG_CHECKPOINT_INTERVAL"],
+                                      keep_checkpoints=app.config["OPLOG_KEEP_CHECKPOINTS"])
     return user_trees[username]
 
+def encoded(encode, *args):
+    """Run a serialize encoder under the "serialize" stage timer."""
+    with metrics.timer("tree_stage_duration_seconds", stage="serialize"):
+        return encode(*args)
+
+def json_bytes_response(body, status=200):
+    """
+    Response for a body already encoded by serialize, compressed with gzip
+    (or br when available) if it is large enough and the client accepts it.
+    """
+    encoding = None
+    if len(body) >= app.config["COMPRESS_MIN_BYTES"]:
+        encoding = request.accept_encodings.best_match(serialize.ENCODINGS)
+    if encoding:
+        with metrics.timer("tree_stage_duration_seconds", stage="compress"):
+            body = serialize.compress(body, encoding, app.config["COMPRESS_LEVEL"])
+    response = Response(body, status=status, mimetype="application/json")
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def conditional_tree_response(build):
+    """
+    Answer 304 when the client's If-None-Match already names the current tree
+    version; otherwise build the response and tag it with that version.
+    The tag is weak: gzip, br and identity bodies of one version share it,
+    and a strong tag must differ between byte-different representations.
+    Call after get_current_user_tree() so the cached version is fresh.
+    """
+    username = get_jwt_identity()
+    owner = hashlib.sha1(username.encode("utf-8")).hexdigest()[:12]
+    etag = f"{owner}-{user_tree_versions.get(username, 0)}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    response = build()
+    response.set_etag(etag, weak=True)
+    return response
+
+@app.route('/changes', methods=['GET'])
+@jwt_required()
+@tree_lock("read")
+def get_changes():
+    """
+    Members and edges changed since the client's last synced version.
+    Returns reset=true when the change log no longer covers that version
+    and the client must refetch /members and /export_json. Without since,
+    returns only the current version, for clients about to do a full fetch.
+    """
+    username = get_jwt_identity()
+    tree = get_current_user_tree()
+    version = user_tree_versions.get(username, 0)
+    if 'since' not in request.args:
+        return jsonify({"version": version})
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({"msg": "since must be an integer"}), 400
+    
+    changed = changed_since(ops_collection, username, since, version)
+    if changed is None:
+        return jsonify({"version": version, "reset": True})
+    
+    result = build_delta(tree, changed)
+    result.update({"version": version, "reset": False})
+    return jsonify(result)
+
+MAX_PAGE_SIZE = 1000
+MAX_WINDOW_MEMBERS = 5000
+
+def project_fields(items, fields):
+    """Keep only the requested keys of each dict; fields is a comma-separated string or None."""
+    if not fields:
+        return items
+    keep = set(fields.split(','))
+    return [{k: v for k, v in item.items() if k in keep} for item in items]
+
+def page_limit(default):
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
 @app.route('/members', methods=['GET'])
 @jwt_required()
+@tree_lock("read")
 def get_members():
+    """
+    Without paging arguments, returns every member as before. With any of
+    cursor, limit or fields, returns one page ordered by mid:
+    {"members": [...], "next_cursor": mid or null}.
+    """
+    tree = get_current_user_tree()
+    if not any(arg in request.args for arg in ('cursor', 'limit', 'fields')):
+        return conditional_tree_response(
+            lambda: json_bytes_response(encoded(serialize.encode_persons, tree.persons.values())))
+    
+    persons, next_cursor = tree.list_members(after=request.args.get('cursor'), limit=page_limit(100))
+    fields = request.args.get('fields')
+    if fields:
+        members = encoded(serialize.dumps, project_fields([p.to_dict() for p in persons], fields))
+    else:
+        members = encoded(serialize.encode_persons, persons)
+    return json_bytes_response(b'{"members":' + members + b',"next_cursor":' + serialize.dumps(next_cursor) + b'}')
+
+@app.route('/search', methods=['GET'])
+@jwt_required()
+@tree_lock("read")
+def search_members():
+    """
+    Type-ahead member search. Query args: q, gender, min_age, max_age,
+    limit (default 10), fuzzy (default 1). Results are ranked best first;
+    an empty q matches nothing.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify([])
+    tree = get_current_user_tree()
+    results = tree.search_members(
+        query,
+        gender=request.args.get('gender') or None,
+        min_age=request.args.get('min_age', type=int),
+        max_age=request.args.get('max_age', type=int),
+        limit=max(1, min(request.args.get('limit', 10, type=int), 100)),
+        fuzzy=request.args.get('fuzzy', '1') != '0',
+    )
+    return jsonify([dict(person.to_dict(), score=round(score, 3)) for person, score in results])
+
+@app.route('/edges', methods=['GET'])
+@jwt_required()
+@tree_lock("read")
+def get_edges():
+    tree = get_current_user_tree()
+    edges, next_cursor = tree.list_edges(after=request.args.get('cursor'), limit=page_limit(500))
+    return json_bytes_response(encoded(serialize.dumps, {"edges": edges, "next_cursor": next_cursor}))
+
+@app.route('/members/<mid>/window', methods=['GET'])
+@jwt_required()
+@tree_lock("read")
+def get_member_window(mid):
+    """Members and edges within `depth` hops of mid, for progressive tree loading."""
     tree = get_current_user_tree()
-    members = list(tree.persons.values())
-    return jsonify(members)
+    if mid not in tree.persons:
+        return jsonify({"msg": "Member not found"}), 404
+    
+    depth = max(0, request.args.get('depth', 2, type=int))
+    max_members = max(1, min(request.args.get('max_members', MAX_WINDOW_MEMBERS, type=int), MAX_WINDOW_MEMBERS))
+    window = tree.get_window(mid, depth=depth, max_members=max_members)
+    window["members"] = project_fields(window["members"], request.args.get('fields'))
+    return jsonify(window)
+
+MAX_AGE = 200
+
+def parse_age(value):
+    """A whole number of years in 0..MAX_AGE (or None); raises ValueError otherwise."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_AGE:
+        raise ValueError(f"age must be a whole number between 0 and {MAX_AGE}")
+    return value
 
 @app.route('/members', methods=['POST'])
 @jwt_required()
+@tree_lock("write")
 def add_member():
     tree = get_current_user_tree()
     data = request.get_json()
@@ -116,41 +574,41 @@ def add_member():
     
     if not name:
         return jsonify({"msg": "Name is required"}), 400
+    try:
+        age = parse_age(age)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
     
-    member = tree.add_person(name, age, gender)
+    person = Person(uuid.uuid4().hex, name, gender, age)
+    current_oplog().apply(tree, "add_person", person)
     
-    user = get_jwt_identity()
-    trees_collection.update_one(
-        {"username": user},
-        {"$set": {"tree": tree.to_dict()}}
-    )
+    save_tree(get_jwt_identity(), tree)
     
-    return jsonify(member), 201
+    return json_bytes_response(encoded(serialize.encode_person, person), status=201)
 
 @app.route('/members/<mid>', methods=['PUT'])
 @jwt_required()
+@tree_lock("write")
 def update_member(mid):
     tree = get_current_user_tree()
     data = request.get_json()
     
     if mid not in tree.persons:
         return jsonify({"msg": "Member not found"}), 404
+    try:
+        age = parse_age(data.get('age'))
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
     
-    person = tree.persons[mid]
-    person.name = data.get('name', person.name)
-    person.age = data.get('age', person.age)
-    person.gender = data.get('gender', person.gender)
+    current_oplog().apply(tree, "edit_person", mid, name=data.get('name'), gender=data.get('gender'), age=age)
     
-    user = get_jwt_identity()
-    trees_collection.update_one(
-        {"username": user},
-        {"$set": {"tree": tree.to_dict()}}
-    )
+    save_tree(get_jwt_identity(), tree)
     
-    return jsonify(person)
+    return json_bytes_response(encoded(serialize.encode_person, tree.persons[mid]))
 
 @app.route('/relationships', methods=['POST'])
 @jwt_required()
+@tree_lock("write")
 def add_relationship():
     tree = get_current_user_tree()
     data = request.get_json()
@@ -165,46 +623,137 @@ def add_relationship():
     if from_mid not in tree.persons or to_mid not in tree.persons:
         return jsonify({"msg": "One or both members not found"}), 404
     
-    if tree.has_relationship(from_mid, to_mid):
+    if to_mid in tree.graph.get(from_mid, {}):
         return jsonify({"msg": "Relationship already exists"}), 400
     
-    tree.add_relationship(from_mid, to_mid, relationship_type)
+    try:
+        current_oplog().apply(tree, "add_relationship", from_mid, to_mid, relationship_type)
+    except KeyError:
+        return jsonify({"msg": f"Unknown relationship {relationship_type!r}"}), 400
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
     
-    user = get_jwt_identity()
-    trees_collection.update_one(
-        {"username": user},
-        {"$set": {"tree": tree.to_dict()}}
-    )
+    save_tree(get_jwt_identity(), tree)
     
     return jsonify({"msg": "Relationship added successfully"}), 201
 
 @app.route('/relatives/<mid>', methods=['GET'])
 @jwt_required()
+@tree_lock("read")
 def get_relatives(mid):
     tree = get_current_user_tree()
     
     if mid not in tree.persons:
         return jsonify({"msg": "Member not found"}), 404
     
-    relatives = tree.get_relatives(mid)
-    relative_members = [tree.persons[rel_mid] for rel_mid in relatives if rel_mid in tree.persons]
+    # Everyone one edge away, derived siblings included
+    relative_members = [tree.persons[rel_mid] for rel_mid, _ in tree._iter_edges(mid) if rel_mid in tree.persons]
     
-    return jsonify(relative_members)
+    return json_bytes_response(encoded(serialize.encode_persons, relative_members))
 
 @app.route('/export_json', methods=['GET'])
 @jwt_required()
+@tree_lock("read")
 def export_json():
     tree = get_current_user_tree()
-    return jsonify(tree.to_dict())
+    return conditional_tree_response(lambda: json_bytes_response(encoded(serialize.encode_tree, tree)))
 
 @app.route('/export_dot', methods=['GET'])
 @jwt_required()
 def export_dot():
     tree = get_current_user_tree()
-    return jsonify({"dot": tree.to_dot()})
+    return conditional_tree_response(lambda: jsonify({"dot": run_heavy_query(tree.get_dot)}))
+
+def history_status(oplog, entry=None):
+    status = {"version": oplog.version, "can_undo": oplog.can_undo, "can_redo": oplog.can_redo}
+    if entry is not None:
+        status.update({"op": entry["args"][0], "members": entry_mids(entry)})
+    return status
+
+@app.route('/undo', methods=['POST'])
+@jwt_required()
+@tree_lock("write")
+def undo():
+    tree = get_current_user_tree()
+    oplog = current_oplog()
+    entry = oplog.undo(tree)
+    if entry is None:
+        return jsonify({"msg": "Nothing to undo"}), 400
+    save_tree(get_jwt_identity(), tree)
+    return jsonify(history_status(oplog, entry))
+
+@app.route('/redo', methods=['POST'])
+@jwt_required()
+@tree_lock("write")
+def redo():
+    tree = get_current_user_tree()
+    oplog = current_oplog()
+    entry = oplog.redo(tree)
+    if entry is None:
+        return jsonify({"msg": "Nothing to redo"}), 400
+    save_tree(get_jwt_identity(), tree)
+    return jsonify(history_status(oplog, entry))
+
+@app.route('/history', methods=['GET'])
+@jwt_required()
+@tree_lock("read")
+def get_history():
+    """Newest-first summaries of the operations retained in memory."""
+    get_current_user_tree()
+    oplog = current_oplog()
+    result = history_status(oplog)
+    result["entries"] = oplog.recent(page_limit(50))
+    return jsonify(result)
+
+def rebuild_stored_version(username, version):
+    """Rebuild a version from the stored checkpoints and op log."""
+    checkpoint = checkpoints_collection.find_one(
+        {"username": username, "version": {"$lte": version}}, sort=[("version", -1)]
+    )
+    if checkpoint is None:
+        raise ValueError(f"Version {version} is no longer available.")
+    entries = ops_collection.find(
+        {"username": username, "version": {"$gt": checkpoint['version'], "$lte": version}},
+        {"_id": 0, "username": 0}
+    ).sort("version", 1)
+    return rebuild(bytes(checkpoint['snapshot']), entries)
+
+@app.route('/history/<int:version>', methods=['GET'])
+@jwt_required()
+def get_tree_version(version):
+    """The tree as it stood at a past version, in the export_json shape."""
+    username = get_jwt_identity()
+    get_current_user_tree()
+    oplog = current_oplog()
+    if version > oplog.version:
+        return jsonify({"msg": "Version not found"}), 404
+    
+    def build():
+        try:
+            return oplog.tree_at(version).to_dict()
+        except ValueError:
+            # Older than the checkpoints kept in memory
+            return rebuild_stored_version(username, version).to_dict()
+    
+    try:
+        return jsonify(run_heavy_query(build))
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 404
+
+@app.route('/lineage', methods=['GET'])
+@jwt_required()
+def get_lineage():
+    """
+    Descendant count, lineage depth and generation index of every member,
+    as {"members": {mid: {descendants, lineage_depth, generation}}}.
+    """
+    tree = get_current_user_tree()
+    return conditional_tree_response(
+        lambda: jsonify({"members": run_heavy_query(tree.get_lineage_aggregates)}))
 
 @app.route('/merge', methods=['POST'])
 @jwt_required()
+@tree_lock("write")
 def merge_trees():
     current_username = get_jwt_identity()
     data = request.get_json()
@@ -219,20 +768,20 @@ def merge_trees():
     if not target_user:
         return jsonify({"msg": "Target user not found"}), 404
     
-    target_tree = FamilyTree()
-    target_tree.from_dict(target_user.get('tree', {}))
+    target_tree = load_tree(target_user)
     
-    current_tree.merge(target_tree)
+    try:
+        current_oplog().apply(current_tree, "merge_with", target_tree)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
     
-    trees_collection.update_one(
-        {"username": current_username},
-        {"$set": {"tree": current_tree.to_dict()}}
-    )
+    save_tree(current_username, current_tree)
     
     return jsonify({"msg": "Trees merged successfully"})
 
 @app.route('/export_csv', methods=['GET'])
 @jwt_required()
+@tree_lock("read")
 def export_csv():
     tree = get_current_user_tree()
     
@@ -254,11 +803,38 @@ def export_csv():
         "edges": edges_csv.getvalue()
     })
 
-@app.route('/kinship/relationship', methods=['POST'])
-@jwt_required()
-def get_relationship():
+def traversal_limits(data):
+    """
+    Build TraversalLimits from the optional request keys max_hops,
+    relationship_types (list of labels, or "blood"), max_nodes and
+    time_budget_ms. Returns None when no limit was asked for.
+    """
+    max_hops = data.get('max_hops')
+    rel_types = data.get('relationship_types')
+    max_nodes = data.get('max_nodes')
+    budget_ms = data.get('time_budget_ms')
+    if max_hops is None and rel_types is None and max_nodes is None and budget_ms is None:
+        return None
+    for name, value in (('max_hops', max_hops), ('max_nodes', max_nodes), ('time_budget_ms', budget_ms)):
+        if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0):
+            raise ValueError(f"{name} must be a non-negative number")
+    if rel_types == "blood":
+        rel_types = TraversalLimits.BLOOD
+    elif rel_types is not None:
+        if not isinstance(rel_types, list) or any(label not in RELATIONSHIP_LABELS_INV for label in rel_types):
+            raise ValueError(f"relationship_types must be \"blood\" or a list of {sorted(RELATIONSHIP_LABELS_INV)}")
+        rel_types = {RELATIONSHIP_LABELS_INV[label] for label in rel_types}
+    return TraversalLimits(
+        max_hops=int(max_hops) if max_hops is not None else None,
+        rel_types=rel_types,
+        max_nodes=int(max_nodes) if max_nodes is not None else None,
+        time_budget=budget_ms / 1000.0 if budget_ms is not None else None,
+    )
+
+def kinship_request():
+    """Validate a kinship POST body; returns (tree, person1, person2, limits) or an error response."""
     tree = get_current_user_tree()
-    data = request.get_json()
+    data = request.get_json() or {}
     
     person1_id = data.get('person1')
     person2_id = data.get('person2')
@@ -269,64 +845,152 @@ def get_relationship():
     if person1_id not in tree.persons or person2_id not in tree.persons:
         return jsonify({"msg": "One or both persons not found"}), 404
     
-    result = tree.get_relationship_analysis(person1_id, person2_id)
-    return jsonify(result)
+    try:
+        limits = traversal_limits(data)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return tree, person1_id, person2_id, limits
+
+def with_search_status(result, limits):
+    """Add whether the search gave up early to a dict result."""
+    if limits is not None:
+        result = dict(result, partial=limits.partial, search=limits.to_dict())
+    return result
+
+@app.route('/kinship/relationship', methods=['POST'])
+@jwt_required()
+def get_relationship():
+    parsed = kinship_request()
+    if len(parsed) != 4:
+        return parsed
+    tree, person1_id, person2_id, limits = parsed
+    
+    result = run_heavy_query(lambda: tree.get_relationship_with_path(person1_id, person2_id, limits))
+    return jsonify(with_search_status(result, limits))
 
 @app.route('/kinship/common_ancestors', methods=['POST'])
 @jwt_required()
 def get_common_ancestors():
-    tree = get_current_user_tree()
-    data = request.get_json()
-    
-    person1_id = data.get('person1')
-    person2_id = data.get('person2')
-    
-    if not person1_id or not person2_id:
-        return jsonify({"msg": "person1 and person2 are required"}), 400
-    
-    if person1_id not in tree.persons or person2_id not in tree.persons:
-        return jsonify({"msg": "One or both persons not found"}), 404
-    
-    ancestors = tree.get_common_ancestors(person1_id, person2_id)
-    ancestor_persons = [tree.persons[anc_id] for anc_id in ancestors if anc_id in tree.persons]
-    
-    return jsonify(ancestor_persons)
+    parsed = kinship_request()
+    if len(parsed) != 4:
+        return parsed
+    tree, person1_id, person2_id, limits = parsed
+    
+    ancestors = run_heavy_query(lambda: tree.get_common_ancestors(person1_id, person2_id, limits))
+    
+    response = json_bytes_response(encoded(serialize.encode_persons, ancestors))
+    if limits is not None:
+        # The body stays a plain list, so report an early stop in a header
+        response.headers['X-Search-Partial'] = 'true' if limits.partial else 'false'
+    return response
 
 @app.route('/kinship/bidirectional', methods=['POST'])
 @jwt_required()
 def get_bidirectional_relationship():
-    tree = get_current_user_tree()
-    data = request.get_json()
+    parsed = kinship_request()
+    if len(parsed) != 4:
+        return parsed
+    tree, person1_id, person2_id, limits = parsed
     
-    person1_id = data.get('person1')
-    person2_id = data.get('person2')
-    
-    if not person1_id or not person2_id:
-        return jsonify({"msg": "person1 and person2 are required"}), 400
-    
-    if person1_id not in tree.persons or person2_id not in tree.persons:
-        return jsonify({"msg": "One or both persons not found"}), 404
-    
-    result = tree.get_bidirectional_relationship(person1_id, person2_id)
-    return jsonify(result)
+    result = run_heavy_query(lambda: tree.get_bidirectional_relationship(person1_id, person2_id, limits))
+    return jsonify(with_search_status(result, limits))
 
 @app.route('/kinship/comprehensive', methods=['POST'])
 @jwt_required()
 def get_comprehensive_analysis():
-    tree = get_current_user_tree()
-    data = request.get_json()
-    
-    person1_id = data.get('person1')
-    person2_id = data.get('person2')
+    parsed = kinship_request()
+    if len(parsed) != 4:
+        return parsed
+    tree, person1_id, person2_id, limits = parsed
     
-    if not person1_id or not person2_id:
-        return jsonify({"msg": "person1 and person2 are required"}), 400
-    
-    if person1_id not in tree.persons or person2_id not in tree.persons:
-        return jsonify({"msg": "One or both persons not found"}), 404
-    
-    result = tree.get_comprehensive_analysis(person1_id, person2_id)
-    return jsonify(result)
+    result = run_heavy_query(lambda: tree.get_detailed_relationship_info(person1_id, person2_id, limits))
+    return jsonify(with_search_status(result, limits))
+
+@app.route('/jobs', methods=['POST'])
+@jwt_required()
+def submit_job():
+    """
+    Start a long-running job and return its id for polling at /jobs/<job_id>.
+    Supported types: merge (target_username), export_json, export_dot,
+    kinship_matrix (members list; optional for trees within the size cap).
+    """
+    username = get_jwt_identity()
+    data = request.get_json() or {}
+    job_type = data.get('type')
+    tree = get_current_user_tree()
+    lock = tree_locks.get(username)
+    
+    if job_type == 'merge':
+        target_username = data.get('target_username')
+        if not target_username:
+            return jsonify({"msg": "target_username is required"}), 400
+        target_user = trees_collection.find_one({"username": target_username})
+        if not target_user:
+            return jsonify({"msg": "Target user not found"}), 404
+        target_tree = load_tree(target_user)
+        
+        def task():
+            with lock.write_locked():
+                # The cache may have been reloaded or dropped since the job was queued
+                current = get_user_tree(username)
+                tree_oplogs[username].apply(current, "merge_with", target_tree)
+                save_tree(username, current)
+                return {"members": len(current.persons)}
+    elif job_type in ('export_json', 'export_dot', 'kinship_matrix'):
+        members = data.get('members')
+        if job_type == 'kinship_matrix':
+            cap = app.config["KINSHIP_MATRIX_MAX_MEMBERS"]
+            count = len(members) if members is not None else len(tree.persons)
+            if members is not None and not isinstance(members, list):
+                return jsonify({"msg": "members must be a list of member ids"}), 400
+            if count > cap:
+                return jsonify({"msg": f"kinship_matrix is limited to {cap} members; pass a members list"}), 400
+        
+        def task():
+            # Work on a private copy so a long job never holds the read lock,
+            # which would queue the next writer and every reader behind it
+            with lock.read_locked():
+                copy = snapshot.loads(snapshot.dumps(get_user_tree(username)), verify=False)
+            if job_type == 'export_json':
+                return copy.to_dict()
+            if job_type == 'export_dot':
+                return {"dot": copy.get_dot()}
+            return copy.get_kinship_matrix(members)
+    else:
+        return jsonify({"msg": "type must be one of merge, export_json, export_dot, kinship_matrix"}), 400
+    
+    job_id = job_pool.submit_job(username, job_type, task)
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    job = job_pool.get_job(get_jwt_identity(), job_id)
+    if job is None:
+        return jsonify({"msg": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    for name, value in tree_locks.stats()["totals"].items():
+        metrics.set_gauge(f"tree_lock_{name}", value)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/metrics/profiles', methods=['GET'])
+@jwt_required()
+def slow_request_profiles():
+    return jsonify(list(profiler.reports))
+
+@app.route('/metrics/locks', methods=['GET'])
+@jwt_required()
+def lock_metrics():
+    """Lock totals across all trees, plus the caller's own tree; other users' trees are not named."""
+    stats = tree_locks.stats()
+    return jsonify({
+        "trees": stats["trees"],
+        "totals": stats["totals"],
+        "tree": stats["per_tree"].get(get_jwt_identity()),
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,344 @@
+"""
+Benchmark suite for the core FamilyTree operations.
+
+Each operation is timed per call on synthetic pedigrees (see synthetic.py)
+of the requested sizes; with --memory every operation is additionally run
+once under tracemalloc to record its peak allocation. Results are written
+as JSON so two runs can be compared:
+
+    python bench.py run --sizes 1000,100000 --output before.json
+    python bench.py run --sizes 1000,100000 --output after.json
+    python bench.py compare before.json after.json
+"""
+from __future__ import annotations
+from typing import Dict, List, Any, Callable, Optional, Tuple
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from family_tree import Person, FamilyTree
+from synthetic import generate_pedigree
+import snapshot
+import serialize
+from oplog import OpLog
+
+
+def _copy(tree: FamilyTree) -> FamilyTree:
+    return snapshot.loads(snapshot.dumps(tree), verify=False)
+
+
+class BenchContext:
+    """Shared state for one tree size: the tree plus seeded samples of members."""
+
+    def __init__(self, tree: FamilyTree, seed: int):
+        self.tree = tree
+        self.rng = random.Random(seed)
+        self.mids = list(tree.persons)
+        self.json_doc = None
+        self.snapshot = None
+        self.other = None
+        self.oplog = None
+        self._counter = 0
+
+    def member(self) -> str:
+        return self.rng.choice(self.mids)
+
+    def pair(self) -> Tuple[str, str]:
+        return self.member(), self.member()
+
+    def fresh_mid(self) -> str:
+        self._counter += 1
+        return f"bench{self._counter}"
+
+
+# Each op returns a zero-argument callable to time; preparation done in the
+# factory itself is not part of the measurement.
+def _query(method: str, arity: int) -> Callable[[BenchContext], Callable[[], Any]]:
+    def factory(ctx: BenchContext):
+        fn = getattr(ctx.tree, method)
+        args = ctx.pair() if arity == 2 else (ctx.member(),)
+        return lambda: fn(*args)
+    return factory
+
+
+def _add_person(ctx: BenchContext):
+    person = Person(ctx.fresh_mid(), "Bench Person", "F", 30)
+    return lambda: ctx.tree.add_person(person)
+
+
+def _delete_person(ctx: BenchContext):
+    mid = ctx.fresh_mid()
+    ctx.tree.add_person(Person(mid, "Bench Person", "M", 30))
+    ctx.tree.graph[mid][ctx.member()] = 12
+    return lambda: ctx.tree.delete_person(mid)
+
+
+def _add_relationship(relationship: str):
+    def factory(ctx: BenchContext):
+        mid = ctx.fresh_mid()
+        ctx.tree.add_person(Person(mid, "Bench Person", "M", 30))
+        other = ctx.member()
+        return lambda: ctx.tree.add_relationship(mid, other, relationship)
+    return factory
+
+
+def _export_json(ctx: BenchContext):
+    return ctx.tree.export_to_json
+
+
+def _import_json(ctx: BenchContext):
+    if ctx.json_doc is None:
+        ctx.json_doc = ctx.tree.export_to_json()
+    return lambda: FamilyTree.import_from_json(ctx.json_doc)
+
+
+def _from_dict(ctx: BenchContext):
+    data = ctx.tree.to_dict()
+    return lambda: FamilyTree().from_dict(data)
+
+
+def _snapshot_dumps(ctx: BenchContext):
+    return lambda: snapshot.dumps(ctx.tree)
+
+
+def _snapshot_loads(ctx: BenchContext):
+    if ctx.snapshot is None:
+        ctx.snapshot = snapshot.dumps(ctx.tree)
+    return lambda: snapshot.loads(ctx.snapshot)
+
+
+def _members_json_stdlib(ctx: BenchContext):
+    # What the response layer did before serialize.py: to_dict() per member, then
+    # the stdlib encoder with Flask's default provider settings
+    return lambda: json.dumps([p.to_dict() for p in ctx.tree.persons.values()],
+                              ensure_ascii=True, sort_keys=True).encode("utf-8")
+
+
+def _members_json_fast(ctx: BenchContext):
+    return lambda: serialize.encode_persons(ctx.tree.persons.values())
+
+
+def _tree_json_stdlib(ctx: BenchContext):
+    return lambda: json.dumps(ctx.tree.to_dict(), ensure_ascii=True, sort_keys=True).encode("utf-8")
+
+
+def _tree_json_fast(ctx: BenchContext):
+    return lambda: serialize.encode_tree(ctx.tree)
+
+
+def _members_json_gzip(ctx: BenchContext):
+    body = serialize.encode_persons(ctx.tree.persons.values())
+    return lambda: serialize.compress(body, "gzip")
+
+
+def _get_dot(ctx: BenchContext):
+    return ctx.tree.get_dot
+
+
+def _lineage_aggregates(ctx: BenchContext):
+    ctx.tree._lineage = None  # time the full build, not the cached values
+    return ctx.tree.get_lineage_aggregates
+
+
+def _merge(ctx: BenchContext):
+    if ctx.other is None:
+        ctx.other = generate_pedigree(max(1, len(ctx.mids) // 10), seed=ctx.rng.randint(0, 2 ** 31), id_prefix="m")
+    base = _copy(ctx.tree)
+    other = _copy(ctx.other)
+    return lambda: base.merge_with(other)
+
+
+def _undo_redo(ctx: BenchContext):
+    if ctx.oplog is None:
+        ctx.oplog = OpLog(checkpoint_interval=10 ** 9)  # time the undo/redo steps, not checkpoints
+    mid = ctx.fresh_mid()
+    ctx.oplog.apply(ctx.tree, "add_person", Person(mid, "Bench Person", "F", 30))
+    ctx.oplog.apply(ctx.tree, "add_relationship", mid, ctx.member(), "Married")
+    return lambda: (ctx.oplog.undo(ctx.tree), ctx.oplog.redo(ctx.tree))
+
+
+# (name, factory, whole_tree); whole-tree operations get fewer repetitions.
+# Mutating operations run last so they do not disturb the query samples.
+OPERATIONS: List[Tuple[str, Callable[[BenchContext], Callable[[], Any]], bool]] = [
+    ("get_immediate_family", _query("get_immediate_family", 1), False),
+    ("get_grandparents", _query("get_grandparents", 1), False),
+    ("get_grandchildren", _query("get_grandchildren", 1), False),
+    ("get_uncles_and_aunts", _query("get_uncles_and_aunts", 1), False),
+    ("get_cousins", _query("get_cousins", 1), False),
+    ("get_nieces_and_nephews", _query("get_nieces_and_nephews", 1), False),
+    ("get_in_laws", _query("get_in_laws", 1), False),
+    ("get_common_ancestors", _query("get_common_ancestors", 2), False),
+    ("get_generation_gap", _query("get_generation_gap", 2), False),
+    ("are_cousins", _query("are_cousins", 2), False),
+    ("is_ancestor", _query("is_ancestor", 2), False),
+    ("get_relationship_path", _query("get_relationship_path", 2), False),
+    ("get_relationship_type", _query("get_relationship_type", 2), False),
+    ("get_detailed_relationship_info", _query("get_detailed_relationship_info", 2), False),
+    ("export_to_json", _export_json, True),
+    ("import_from_json", _import_json, True),
+    ("from_dict", _from_dict, True),
+    ("snapshot_dumps", _snapshot_dumps, True),
+    ("snapshot_loads", _snapshot_loads, True),
+    ("members_json_stdlib", _members_json_stdlib, True),
+    ("members_json_fast", _members_json_fast, True),
+    ("members_json_gzip", _members_json_gzip, True),
+    ("tree_json_stdlib", _tree_json_stdlib, True),
+    ("tree_json_fast", _tree_json_fast, True),
+    ("get_dot", _get_dot, True),
+    ("get_lineage_aggregates", _lineage_aggregates, True),
+    ("merge_with", _merge, True),
+    ("add_person", _add_person, False),
+    ("add_relationship_married", _add_relationship("Married"), False),
+    ("add_relationship_parent", _add_relationship("Parent"), False),
+    ("delete_person", _delete_person, False),
+    ("undo_redo", _undo_redo, False),
+]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def bench_operation(ctx: BenchContext, factory, iterations: int, budget: float, memory: bool) -> Dict[str, Any]:
+    timings: List[float] = []
+    result: Dict[str, Any] = {}
+    spent = 0.0
+    try:
+        for _ in range(iterations):
+            call = factory(ctx)
+            start = time.perf_counter()
+            call()
+            elapsed = time.perf_counter() - start
+            timings.append(elapsed)
+            spent += elapsed
+            if spent > budget:
+                break
+        if memory:
+            call = factory(ctx)
+            tracemalloc.start()
+            try:
+                call()
+                result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    except RecursionError:
+        result["error"] = "RecursionError"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    if timings:
+        result.update({
+            "calls": len(timings),
+            "mean_s": statistics.fmean(timings),
+            "p50_s": _percentile(timings, 0.5),
+            "p95_s": _percentile(timings, 0.95),
+            "max_s": max(timings),
+        })
+    return result
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(sizes: List[int], iterations: int, budget: float, memory: bool, seed: int,
+        only: Optional[List[str]] = None) -> Dict[str, Any]:
+    results = []
+    for size in sizes:
+        start = time.perf_counter()
+        tree = generate_pedigree(size, seed=seed)
+        print(f"[{size}] generated in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+        ctx = BenchContext(tree, seed)
+        for name, factory, whole_tree in OPERATIONS:
+            if only and name not in only:
+                continue
+            reps = max(1, min(iterations, 5)) if whole_tree else iterations
+            row = {"size": size, "op": name}
+            row.update(bench_operation(ctx, factory, reps, budget, memory))
+            results.append(row)
+            status = row.get("error") or f"mean {row.get('mean_s', 0) * 1e3:.3f}ms"
+            print(f"[{size}] {name}: {status}", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "revision": _git_revision(),
+            "timestamp": time.time(),
+            "seed": seed,
+            "iterations": iterations,
+        },
+        "results": results,
+    }
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Pair up rows by (size, op) and report the mean-time ratio after/before."""
+    old = {(r["size"], r["op"]): r for r in before["results"]}
+    rows = []
+    for r in after["results"]:
+        prev = old.get((r["size"], r["op"]))
+        if not prev or "mean_s" not in prev or "mean_s" not in r:
+            continue
+        rows.append({
+            "size": r["size"],
+            "op": r["op"],
+            "before_s": prev["mean_s"],
+            "after_s": r["mean_s"],
+            "ratio": r["mean_s"] / prev["mean_s"] if prev["mean_s"] else None,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark FamilyTree operations on synthetic pedigrees.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--sizes", default="1000", help="comma-separated member counts, e.g. 1000,100000,1000000")
+    run_parser.add_argument("--iterations", type=int, default=50)
+    run_parser.add_argument("--budget", type=float, default=10.0, help="max seconds spent per operation and size")
+    run_parser.add_argument("--memory", action="store_true", help="also record peak allocation with tracemalloc")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--only", default=None, help="comma-separated subset of operations")
+    run_parser.add_argument("--output", default=None)
+    cmp_parser = sub.add_parser("compare")
+    cmp_parser.add_argument("before")
+    cmp_parser.add_argument("after")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+        report = run(
+            [int(s) for s in args.sizes.split(",")], args.iterations, args.budget, args.memory, args.seed,
+            only=args.only.split(",") if args.only else None,
+        )
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as fh:
+                fh.write(text)
+        else:
+            print(text)
+    else:
+        with open(args.before) as fh:
+            before = json.load(fh)
+        with open(args.after) as fh:
+            after = json.load(fh)
+        rows = compare(before, after)
+        print(json.dumps(rows, indent=2))
+        for row in rows:
+            ratio = f"x{row['ratio']:.2f}" if row["ratio"] is not None else "n/a"
+            print(f"{row['size']:>9} {row['op']:<32} {row['before_s'] * 1e3:10.3f}ms -> "
+                  f"{row['after_s'] * 1e3:10.3f}ms  {ratio}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
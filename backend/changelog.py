@@ -0,0 +1,55 @@
+from __future__ import annotations
+from typing import Dict, List, Any, Optional, Set, Iterable
+
+from family_tree import FamilyTree
+
+
+# Clients further behind than this refetch instead of replaying the log
+MAX_DELTA_VERSIONS = 1000
+
+
+def changed_since(ops_collection, username: str, since: int, version: int) -> Optional[Set[str]]:
+    """
+    Members changed after version `since`, read from the shared op log
+    (every op document lists the members it touched), so the answer is
+    the same from every worker. Returns None if the log cannot tell: the
+    version is unknown, too far behind, or its ops have been compacted.
+    """
+    if since < 0 or since > version or version - since > MAX_DELTA_VERSIONS:
+        return None
+    if since == version:
+        return set()
+    changed: Set[str] = set()
+    seen = 0
+    ops = ops_collection.find(
+        {"username": username, "version": {"$gt": since, "$lte": version}},
+        {"members": 1, "_id": 0}
+    )
+    for op in ops:
+        changed.update(op.get("members", ()))
+        seen += 1
+    return changed if seen == version - since else None
+
+
+def build_delta(tree: FamilyTree, mids: Iterable[str]) -> Dict[str, Any]:
+    """
+    Current state of the given members in the to_dict() shapes: their person
+    records, the IDs of those deleted, and every edge leaving them.
+    Relationships are stored in both directions, so a client that drops all
+    edges whose "from" is a changed member and adds these back ends up with
+    exactly the server's edges.
+    """
+    members: List[Dict[str, Any]] = []
+    deleted: List[str] = []
+    edges: List[Dict[str, Any]] = []
+    for mid in sorted(mids):
+        person = tree.persons.get(mid)
+        if person is None:
+            deleted.append(mid)
+            continue
+        members.append(person.to_dict())
+        edges.extend(
+            {"from": mid, "to": to_mid, "relationship": rel}
+            for to_mid, rel in tree.graph.get(mid, {}).items()
+        )
+    return {"members": members, "deleted": deleted, "edges": edges}
@@ -1,7 +1,12 @@
 from __future__ import annotations
-from typing import Dict, Set, List, Tuple, Optional, Any, Union
+from typing import Dict, Set, List, Tuple, Optional, Any, Union, Callable
 from collections import defaultdict, deque
+import bisect
 import json
+import time
+
+from search_index import MemberSearchIndex
+from lineage import LineageAggregates
 
 # Relationship weights and labels
 RELATIONSHIP_LABELS = {
@@ -12,6 +17,9 @@ RELATIONSHIP_LABELS = {
     10: "Divorced",
 }
 RELATIONSHIP_LABELS_INV = {v: k for k, v in RELATIONSHIP_LABELS.items()}
+# Order in which path searches try a member's edges, so equal-length paths
+# resolve the same way however the edges were added (or derived)
+EDGE_SEARCH_ORDER = {13: 0, 14: 1, 12: 2, 11: 3, 10: 4}
 
 class Person:
     def __init__(self, mid: str, name: str, gender: str, age: int):
@@ -41,30 +49,186 @@ class Person:
     def from_dict(data: Dict[str, Any]) -> Person:
         return Person(data["mid"], data["name"], data["gender"], data["age"])
 
+class TraversalLimits:
+    """
+    Bounds for a graph search: maximum hops from the start, which relationship
+    weights may be followed, and a node-visit and/or wall-clock budget.
+
+    Pass one to a search; afterwards `partial` tells whether the search gave
+    up early (budget spent, or it missed its target after skipping nodes
+    beyond max_hops), in which case a "not found" answer only means "not
+    found within these limits". A target found within max_hops is a
+    complete answer.
+    One instance may be shared by several searches to give them a joint budget.
+    """
+    BLOOD = frozenset({13, 14, 12})  # Parent, Son-Daughter, Sibling
+
+    def __init__(self, max_hops: Optional[int] = None, rel_types: Optional[Set[int]] = None,
+                 max_nodes: Optional[int] = None, time_budget: Optional[float] = None):
+        self.max_hops = max_hops
+        self.rel_types = frozenset(rel_types) if rel_types is not None else None
+        self.max_nodes = max_nodes
+        self.time_budget = time_budget  # seconds
+        self.visited = 0
+        self.partial = False
+        self.reason: Optional[str] = None
+        self._deadline: Optional[float] = None
+        self._hops_cut = False  # the current search skipped nodes beyond max_hops
+
+    def allows(self, rel: int) -> bool:
+        return self.rel_types is None or rel in self.rel_types
+
+    def within_hops(self, hops: int) -> bool:
+        if self.max_hops is not None and hops > self.max_hops:
+            self._hops_cut = True
+            return False
+        return True
+
+    def search_ended(self, found: bool) -> None:
+        """Call when one search finishes; a miss after skipping nodes beyond max_hops is partial."""
+        if self._hops_cut and not found:
+            self._stop("max_hops")
+        self._hops_cut = False
+
+    def visit(self) -> bool:
+        """Count one expanded node; False once the budget is spent."""
+        if self.time_budget is not None and self._deadline is None:
+            self._deadline = time.perf_counter() + self.time_budget
+        self.visited += 1
+        if self.max_nodes is not None and self.visited > self.max_nodes:
+            self._stop("max_nodes")
+            return False
+        # Checking the clock on every node would dominate small searches
+        if self._deadline is not None and self.visited % 64 == 0 and time.perf_counter() > self._deadline:
+            self._stop("time_budget")
+            return False
+        return True
+
+    def _stop(self, reason: str) -> None:
+        self.partial = True
+        if self.reason is None:
+            self.reason = reason
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"partial": self.partial, "reason": self.reason, "nodes_visited": self.visited}
+
 class FamilyTree:
+    # Optional hook called as traversal_observer(name, nodes_visited) after each graph search
+    traversal_observer: Optional[Callable[[str, int], None]] = None
+    # When False (the default) siblings are derived from shared parents and only
+    # explicitly declared Sibling edges are stored. When True, adding a child also
+    # writes Sibling edges between every pair of that parent's children.
+    materialize_siblings: bool = False
+
     def __init__(self):
         self.persons: Dict[str, Person] = {}  # mid -> Person
         self.graph: Dict[str, Dict[str, int]] = defaultdict(dict)  # mid -> {mid: relationship_weight}
+        self.dirty: Set[str] = set()  # mids whose person or edge row changed since take_dirty()
+        self._sorted_mids: Optional[List[str]] = None  # lazily built index for cursor pagination
+        self._search_index: Optional[MemberSearchIndex] = None  # built on first search, then maintained
+        self._lineage: Optional[LineageAggregates] = None  # built on first request, then maintained
+        self._journal: Optional[Dict[str, Dict[str, Any]]] = None  # mid -> image before the current operation
+
+    # === Change Tracking ===
+    def _touch(self, *mids: str) -> None:
+        self.dirty.update(mids)
+
+    def take_dirty(self) -> Set[str]:
+        """Return and reset the set of members changed since the last call."""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    # === Journaling (see oplog.py) ===
+    def begin_journal(self) -> None:
+        """Start capturing the prior image of every member the next mutations touch."""
+        self._journal = {}
+
+    def end_journal(self) -> Dict[str, Dict[str, Any]]:
+        journal, self._journal = self._journal or {}, None
+        return journal
+
+    def _record(self, *mids: str) -> None:
+        # Called before a member's person or edge row is written
+        if self._journal is None:
+            return
+        for mid in mids:
+            if mid not in self._journal:
+                self._journal[mid] = self.member_image(mid)
+
+    def member_image(self, mid: str) -> Dict[str, Any]:
+        """A member's person record and outgoing edges; person is None if absent."""
+        person = self.persons.get(mid)
+        row = self.graph.get(mid)
+        return {
+            "person": person.to_dict() if person is not None else None,
+            "edges": [[to_mid, rel] for to_mid, rel in row.items()] if row else [],
+        }
+
+    def restore_member(self, mid: str, image: Dict[str, Any]) -> None:
+        """Overwrite a member's person record and edge row with a member_image()."""
+        data = image["person"]
+        if data is None:
+            if self.persons.pop(mid, None) is not None:
+                self._sorted_mids = None
+                if self._search_index is not None:
+                    self._search_index.remove(mid)
+        else:
+            if mid not in self.persons:
+                self._sorted_mids = None
+            self.persons[mid] = Person.from_dict(data)
+            if self._search_index is not None:
+                self._search_index.add(mid, data["name"])
+        if image["edges"]:
+            self.graph[mid] = {to_mid: rel for to_mid, rel in image["edges"]}
+        else:
+            self.graph.pop(mid, None)
+        self._lineage = None  # rebuilt on next request
+        self._touch(mid)
 
     # === Person Management ===
     def add_person(self, person: Person) -> None:
+        self._record(person.mid)
         self.persons[person.mid] = person
+        self._sorted_mids = None
+        if self._search_index is not None:
+            self._search_index.add(person.mid, person.name)
+        if self._lineage is not None:
+            self._lineage.add_member(person.mid)
+        self._touch(person.mid)
 
     def edit_person(self, mid: str, name: Optional[str] = None, gender: Optional[str] = None, age: Optional[int] = None) -> None:
         if mid not in self.persons:
             raise ValueError(f"Person {mid} not found.")
+        self._record(mid)
         p = self.persons[mid]
         if name: p.name = name
         if gender: p.gender = gender
         if age is not None: p.age = age
+        if name and self._search_index is not None:
+            self._search_index.add(mid, name)
+        self._touch(mid)
 
     def delete_person(self, mid: str) -> None:
         if mid not in self.persons:
             raise ValueError(f"Person {mid} not found.")
+        if self._lineage is not None:
+            # Unlink parents and children first so the aggregates see each change
+            for other, rel in list(self.graph.get(mid, {}).items()):
+                if rel in (13, 14):
+                    self.delete_relationship(mid, other)
+            self._lineage.remove_member(mid)
+        self._record(mid)
         del self.persons[mid]
         self.graph.pop(mid, None)
-        for rels in self.graph.values():
-            rels.pop(mid, None)
+        self._sorted_mids = None
+        if self._search_index is not None:
+            self._search_index.remove(mid)
+        self._touch(mid)
+        for other, rels in self.graph.items():
+            if mid in rels:
+                self._record(other)
+                del rels[mid]
+                self._touch(other)
 
     # === Relationship Management ===
     def add_relationship(self, mid1: str, mid2: str, relationship: Union[int, str]) -> None:
@@ -92,36 +256,49 @@ class FamilyTree:
             raise ValueError(f"Relationship already exists between {self.persons[mid1].name} and {self.persons[mid2].name}.")
             
         # Add the primary relationship
+        self._record(mid1, mid2)
         self.graph[mid1][mid2] = weight
+        self._touch(mid1, mid2)
         
         # Automatically add complementary relationships
         if weight == 13:  # Parent -> automatically add Son-Daughter
             self.graph[mid2][mid1] = 14
-            # Auto-create sibling relationships between children
-            self._auto_create_sibling_relationships(mid1)
+            if self.materialize_siblings:
+                self._auto_create_sibling_relationships(mid2)
         elif weight == 14:  # Son-Daughter -> automatically add Parent
             self.graph[mid2][mid1] = 13
-            # Auto-create sibling relationships between children
-            self._auto_create_sibling_relationships(mid2)
+            if self.materialize_siblings:
+                self._auto_create_sibling_relationships(mid1)
         elif weight == 12:  # Sibling -> bidirectional
             self.graph[mid2][mid1] = 12
         elif weight == 11:  # Married -> bidirectional
             self.graph[mid2][mid1] = 11
         elif weight == 10:  # Divorced -> bidirectional
             self.graph[mid2][mid1] = 10
+        self._parent_link_changed(mid1, mid2, weight, added=True)
+
+    def _parent_link_changed(self, mid1: str, mid2: str, weight: int, added: bool) -> None:
+        if self._lineage is None:
+            return
+        if weight == 13:
+            self._lineage.parent_link_changed(mid1, mid2, added)
+        elif weight == 14:
+            self._lineage.parent_link_changed(mid2, mid1, added)
 
     def _auto_create_sibling_relationships(self, parent_mid: str) -> None:
         """Automatically create sibling relationships between all children of a parent."""
-        children = self._get_by_relationship(parent_mid, 14)  # Get all children
+        children = list(self._get_by_relationship(parent_mid, 14))  # Get all children
         if len(children) > 1:
             # Create sibling relationships between all children
             for i, child1 in enumerate(children):
                 for child2 in children[i+1:]:
                     # Only add if not already exists
+                    self._record(child1, child2)
                     if child1 not in self.graph or child2 not in self.graph[child1]:
                         self.graph[child1][child2] = 12  # Sibling
                     if child2 not in self.graph or child1 not in self.graph[child2]:
                         self.graph[child2][child1] = 12  # Sibling
+                    self._touch(child1, child2)
 
     def add_parent_child_relationship(self, parent_mid: str, child_mid: str) -> None:
         """
@@ -177,7 +354,9 @@ class FamilyTree:
         weight = self.graph[mid1].get(mid2)
         if weight is None:
             return
+        self._record(mid1, mid2)
         del self.graph[mid1][mid2]
+        self._touch(mid1, mid2)
         # Remove complementary/symmetric
         if weight == 13 and mid2 in self.graph and mid1 in self.graph[mid2]:
             if self.graph[mid2][mid1] == 14:
@@ -188,6 +367,109 @@ class FamilyTree:
         elif weight in (12, 11, 10) and mid2 in self.graph and mid1 in self.graph[mid2]:
             if self.graph[mid2][mid1] == weight:
                 del self.graph[mid2][mid1]
+        self._parent_link_changed(mid1, mid2, weight, added=False)
+
+    # === Listing ===
+    def _get_sorted_mids(self) -> List[str]:
+        mids = self._sorted_mids
+        if mids is None or len(mids) != len(self.persons):
+            mids = self._sorted_mids = sorted(self.persons)
+        return mids
+
+    def list_members(self, after: Optional[str] = None, limit: int = 100) -> Tuple[List[Person], Optional[str]]:
+        """
+        One page of members ordered by mid, starting after the `after` cursor.
+        Returns (persons, next_cursor); next_cursor is None on the last page.
+        """
+        mids = self._get_sorted_mids()
+        start = bisect.bisect_right(mids, after) if after is not None else 0
+        page = mids[start:start + limit]
+        next_cursor = page[-1] if start + limit < len(mids) and page else None
+        return [self.persons[m] for m in page], next_cursor
+
+    def list_edges(self, after: Optional[str] = None, limit: int = 500) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of edges grouped by their "from" member, ordered by mid.
+        A page always holds whole rows, so it may exceed `limit` by the size of
+        the last row; the cursor is the last "from" mid included.
+        """
+        mids = self._get_sorted_mids()
+        start = bisect.bisect_right(mids, after) if after is not None else 0
+        edges: List[Dict[str, Any]] = []
+        i = start
+        while i < len(mids) and len(edges) < limit:
+            mid = mids[i]
+            edges.extend(
+                {"from": mid, "to": to_mid, "relationship": rel}
+                for to_mid, rel in self.graph.get(mid, {}).items()
+            )
+            i += 1
+        next_cursor = mids[i - 1] if i < len(mids) and i > start else None
+        return edges, next_cursor
+
+    def get_window(self, mid: str, depth: int = 2, max_members: Optional[int] = None) -> Dict[str, Any]:
+        """
+        The subgraph within `depth` hops of `mid` (any relationship type),
+        found breadth-first so the nearest members are kept when the window is
+        capped at `max_members`. Only edges between members in the window are
+        returned; "truncated" tells whether the cap cut the window short.
+        """
+        if mid not in self.persons:
+            raise ValueError(f"Person {mid} not found.")
+        hops = {mid: 0}
+        queue = deque([mid])
+        truncated = False
+        while queue:
+            curr = queue.popleft()
+            if hops[curr] >= depth:
+                continue
+            for to_mid in self.graph.get(curr, {}):
+                if to_mid in hops or to_mid not in self.persons:
+                    continue
+                if max_members is not None and len(hops) >= max_members:
+                    truncated = True
+                    break
+                hops[to_mid] = hops[curr] + 1
+                queue.append(to_mid)
+            if truncated:
+                break
+        self._report_traversal("window", len(hops))
+        return {
+            "members": [dict(self.persons[m].to_dict(), hops=h) for m, h in hops.items()],
+            "edges": [
+                {"from": m, "to": to_mid, "relationship": rel}
+                for m in hops
+                for to_mid, rel in self.graph.get(m, {}).items()
+                if to_mid in hops
+            ],
+            "truncated": truncated,
+        }
+
+    # === Search ===
+    def search_members(self, query: str, gender: Optional[str] = None, min_age: Optional[int] = None,
+                       max_age: Optional[int] = None, limit: int = 10, fuzzy: bool = True) -> List[Tuple[Person, float]]:
+        """
+        Ranked name search: prefix matches first, then trigram fuzzy matches,
+        optionally filtered by gender and an inclusive age range.
+        Returns up to `limit` (Person, score) pairs.
+        """
+        if self._search_index is None:
+            self._search_index = MemberSearchIndex.build((p.mid, p.name) for p in self.persons.values())
+
+        def accept(mid: str) -> bool:
+            p = self.persons.get(mid)
+            if p is None:
+                return False
+            if gender and p.gender != gender:
+                return False
+            if min_age is not None and (p.age is None or p.age < min_age):
+                return False
+            if max_age is not None and (p.age is None or p.age > max_age):
+                return False
+            return True
+
+        results = self._search_index.search(query, fuzzy=fuzzy, limit=limit, accept=accept)
+        return [(self.persons[mid], score) for mid, score in results]
 
     # === Visualization ===
     def get_dot(self, start_mid: Optional[str] = None, depth: Optional[int] = None) -> str:
@@ -248,9 +530,20 @@ class FamilyTree:
         lines.append("}")
         return "\n".join(lines)
 
+    # === Lineage Aggregates ===
+    def get_lineage_aggregates(self) -> Dict[str, Dict[str, Optional[int]]]:
+        """
+        mid -> {descendants, lineage_depth, generation} for every member.
+        Computed in one pass on first use and kept current as parent links
+        change; descendants shared through several lines are counted once.
+        """
+        if self._lineage is None or self._lineage.stale:
+            self._lineage = LineageAggregates.build(self.graph, self.persons)
+        return {mid: self._lineage.get(mid) for mid in self.persons}
+
     # === JSON Support ===
-    def export_to_json(self) -> str:
-        data = {
+    def to_dict(self) -> Dict[str, Any]:
+        return {
             "persons": [p.to_dict() for p in self.persons.values()],
             "edges": [
                 {"from": mid1, "to": mid2, "relationship": rel}
@@ -258,7 +551,28 @@ class FamilyTree:
                 for mid2, rel in rels.items()
             ]
         }
-        return json.dumps(data)
+
+    def from_dict(self, data: Dict[str, Any]) -> FamilyTree:
+        """
+        Load persons and edges from a to_dict() payload into this tree.
+        Edges are restored verbatim (complementary edges are already part of
+        the payload), so no sibling fan-out or duplicate checks are re-run.
+        """
+        self.persons = {}
+        self.graph = defaultdict(dict)
+        self._lineage = None
+        for p in data.get("persons", []):
+            self.add_person(Person.from_dict(p))
+        for edge in data.get("edges", []):
+            rel = edge["relationship"]
+            if isinstance(rel, str):
+                rel = RELATIONSHIP_LABELS_INV[rel]
+            self.graph[edge["from"]][edge["to"]] = rel
+        self.dirty = set()
+        return self
+
+    def export_to_json(self) -> str:
+        return json.dumps(self.to_dict())
 
     @staticmethod
     def import_from_json(json_obj: Union[str, Dict[str, Any]]) -> FamilyTree:
@@ -270,6 +584,9 @@ class FamilyTree:
         for p in data["persons"]:
             tree.add_person(Person.from_dict(p))
         for edge in data["edges"]:
+            # Exports list both directions; the first one already added its complement
+            if edge["to"] in tree.graph.get(edge["from"], {}):
+                continue
             tree.add_relationship(edge["from"], edge["to"], edge["relationship"])
         return tree
 
@@ -281,8 +598,11 @@ class FamilyTree:
                 raise ValueError(f"Duplicate member ID {mid} in merge.")
             self.add_person(person)
         for mid1, rels in other_tree.graph.items():
+            self._record(mid1)
             for mid2, rel in rels.items():
                 self.graph[mid1][mid2] = rel
+            self._touch(mid1)
+        self._lineage = None  # rebuilt on next request rather than replayed edge by edge
         if link:
             self.add_relationship(*link)
 
@@ -297,11 +617,63 @@ class FamilyTree:
     def _get_by_relationship(self, mid: str, rel_type: int) -> Set[str]:
         return {to_mid for to_mid, rel in self.graph.get(mid, {}).items() if rel == rel_type}
 
+    def _get_sibling_mids(self, mid: str) -> Set[str]:
+        """Declared siblings plus everyone sharing at least one parent with mid."""
+        siblings = self._get_by_relationship(mid, 12)
+        for parent in self._get_by_relationship(mid, 13):
+            siblings |= self._get_by_relationship(parent, 14)
+        siblings.discard(mid)
+        return siblings
+
+    def _iter_edges(self, mid: str):
+        """
+        Stored edges of mid followed by its derived Sibling edges, as
+        (to_mid, weight), each member once. Yields the same edges whether
+        siblings are materialised or derived; see _search_edges for order.
+        """
+        rels = self.graph.get(mid, {})
+        yield from rels.items()
+        seen = set(rels)
+        seen.add(mid)
+        for parent, rel in rels.items():
+            if rel != 13:
+                continue
+            for child, child_rel in self.graph.get(parent, {}).items():
+                if child_rel == 14 and child not in seen:
+                    seen.add(child)
+                    yield child, 12
+
+    def _search_edges(self, mid: str, skip: Set[str]) -> List[Tuple[int, str, int]]:
+        """
+        (order, to_mid, weight) for the _iter_edges of mid not in skip, sorted
+        by EDGE_SEARCH_ORDER then mid, so the result does not depend on
+        insertion order. Filtering first keeps the sort to unvisited members.
+        """
+        order = EDGE_SEARCH_ORDER
+        graph = self.graph
+        rels = graph.get(mid, {})
+        edges = [(order.get(rel, 5), to_mid, rel) for to_mid, rel in rels.items() if to_mid not in skip]
+        sibling_order = order[12]
+        for parent, rel in rels.items():
+            if rel == 13:
+                for child, child_rel in graph.get(parent, {}).items():
+                    # Derived siblings: skip mid itself and members it has a stored edge to
+                    if child_rel == 14 and child not in skip and child != mid and child not in rels:
+                        edges.append((sibling_order, child, 12))
+        if len(edges) > 1:
+            edges = sorted(set(edges))  # full siblings are reached through both parents
+        return edges
+
+    def _report_traversal(self, name: str, visited: int) -> None:
+        observer = FamilyTree.traversal_observer
+        if observer is not None:
+            observer(name, visited)
+
     # === Inferred Relationship Queries ===
     def get_immediate_family(self, mid: str) -> Dict[str, List[Person]]:
         parents = [self.persons[m] for m in self._get_by_relationship(mid, 13)]
         children = [self.persons[m] for m in self._get_by_relationship(mid, 14)]
-        siblings = [self.persons[m] for m in self._get_by_relationship(mid, 12)]
+        siblings = [self.persons[m] for m in self._get_sibling_mids(mid)]
         spouses = [self.persons[m] for m in self._get_by_relationship(mid, 11)]
         return {
             "parents": parents,
@@ -310,6 +682,26 @@ class FamilyTree:
             "spouses": spouses,
         }
 
+    def get_siblings(self, mid: str) -> Dict[str, List[Person]]:
+        """
+        Siblings split by kind: "full" share every known parent (at least two),
+        "half" share some but not all, and "declared" are linked only by an
+        explicit Sibling edge with no parent in common.
+        """
+        parents = self._get_by_relationship(mid, 13)
+        result: Dict[str, List[Person]] = {"full": [], "half": [], "declared": []}
+        for sibling in self._get_sibling_mids(mid):
+            sibling_parents = self._get_by_relationship(sibling, 13)
+            shared = parents & sibling_parents
+            if not shared:
+                kind = "declared"
+            elif len(shared) >= 2 and parents == sibling_parents:
+                kind = "full"
+            else:
+                kind = "half"
+            result[kind].append(self.persons[sibling])
+        return result
+
     def get_grandparents(self, mid: str) -> List[Person]:
         grandparents = set()
         for parent in self._get_by_relationship(mid, 13):
@@ -325,58 +717,81 @@ class FamilyTree:
     def get_uncles_and_aunts(self, mid: str) -> List[Person]:
         uncles_aunts = set()
         for parent in self._get_by_relationship(mid, 13):
-            uncles_aunts.update(self._get_by_relationship(parent, 12))
+            uncles_aunts.update(self._get_sibling_mids(parent))
         return [self.persons[m] for m in uncles_aunts]
 
     def get_cousins(self, mid: str) -> List[Person]:
         cousins = set()
         for parent in self._get_by_relationship(mid, 13):
-            for sibling in self._get_by_relationship(parent, 12):
+            for sibling in self._get_sibling_mids(parent):
                 cousins.update(self._get_by_relationship(sibling, 14))
         return [self.persons[m] for m in cousins]
 
     def get_nieces_and_nephews(self, mid: str) -> List[Person]:
         nieces_nephews = set()
-        for sibling in self._get_by_relationship(mid, 12):
+        for sibling in self._get_sibling_mids(mid):
             nieces_nephews.update(self._get_by_relationship(sibling, 14))
         return [self.persons[m] for m in nieces_nephews]
 
     def get_in_laws(self, mid: str) -> List[Person]:
         inlaws = set()
         for spouse in self._get_by_relationship(mid, 11):
-            inlaws.update(self._get_by_relationship(spouse, 12))  # spouse's siblings
+            inlaws.update(self._get_sibling_mids(spouse))  # spouse's siblings
             inlaws.update(self._get_by_relationship(spouse, 13))  # spouse's parents
         return [self.persons[m] for m in inlaws]
 
-    def get_common_ancestors(self, mid1: str, mid2: str) -> List[Person]:
-        """Get all common ancestors between two people."""
+    def get_common_ancestors(self, mid1: str, mid2: str, limits: Optional[TraversalLimits] = None) -> List[Person]:
+        """Get all common ancestors between two people (within `limits` generations/budget if given)."""
         def get_ancestors(mid: str) -> Set[str]:
             visited = set()
-            stack = [mid]
-            while stack:
-                curr = stack.pop()
+            # Breadth-first, so each ancestor is reached at its nearest generation
+            queue = deque([(mid, 0)])
+            while queue:
+                curr, hops = queue.popleft()
+                if limits is not None and not limits.visit():
+                    break
                 for parent in self._get_by_relationship(curr, 13):
                     if parent not in visited:
+                        if limits is not None and not limits.within_hops(hops + 1):
+                            continue
                         visited.add(parent)
-                        stack.append(parent)
+                        queue.append((parent, hops + 1))
+            if limits is not None:
+                # Every ancestor is a target here, so any cut-off leaves the set incomplete
+                limits.search_ended(found=False)
             return visited
+        if limits is not None and not limits.allows(13):
+            return []
         a1 = get_ancestors(mid1)
         a2 = get_ancestors(mid2)
+        self._report_traversal("common_ancestors", len(a1) + len(a2))
         return [self.persons[m] for m in a1 & a2]
 
-    def get_generation_gap(self, mid1: str, mid2: str) -> Optional[int]:
+    def get_generation_gap(self, mid1: str, mid2: str, limits: Optional[TraversalLimits] = None) -> Optional[int]:
         # BFS from mid1 to mid2, count parent/child steps
         queue = deque([(mid1, 0)])
         visited = set([mid1])
         while queue:
             curr, depth = queue.popleft()
             if curr == mid2:
+                self._report_traversal("generation_gap", len(visited))
+                if limits is not None:
+                    limits.search_ended(found=True)
                 return depth
+            if limits is not None and not limits.visit():
+                break
             for rel in (13, 14):
+                if limits is not None and not limits.allows(rel):
+                    continue
                 for neighbor in self._get_by_relationship(curr, rel):
                     if neighbor not in visited:
+                        if limits is not None and not limits.within_hops(depth + 1):
+                            continue
                         visited.add(neighbor)
                         queue.append((neighbor, depth + 1))
+        self._report_traversal("generation_gap", len(visited))
+        if limits is not None:
+            limits.search_ended(found=False)
         return None
 
     def are_cousins(self, mid1: str, mid2: str) -> bool:
@@ -398,44 +813,54 @@ class FamilyTree:
                     if dfs(to_mid):
                         return True
             return False
-        return dfs(descendant_mid)
+        found = dfs(descendant_mid)
+        self._report_traversal("is_ancestor", len(visited))
+        return found
 
     def would_create_cycle(self, parent_mid: str, child_mid: str) -> bool:
         """Check if adding a parent relationship would create a cycle."""
         # Check if child is already an ancestor of the parent
         return self.is_ancestor(child_mid, parent_mid)
 
-    def get_relationship_path(self, mid1: str, mid2: str) -> Optional[List[Tuple[str, str, str]]]:
+    def get_relationship_path(self, mid1: str, mid2: str,
+                              limits: Optional[TraversalLimits] = None) -> Optional[List[Tuple[str, str, str]]]:
         # Check if both persons exist
         if mid1 not in self.persons or mid2 not in self.persons:
             return None
             
         # BFS for shortest path, return [(from_mid, to_mid, relationship_label)]
+        # Derived sibling links count as one "Sibling" step, like stored ones
         queue = deque([(mid1, [])])
         visited = set([mid1])
         while queue:
             curr, path = queue.popleft()
             if curr == mid2:
+                self._report_traversal("relationship_path", len(visited))
+                if limits is not None:
+                    limits.search_ended(found=True)
                 # Build the path from the BFS result
                 result_path = []
-                for i in range(len(path)):
-                    from_mid = path[i][0]
-                    to_mid = path[i][1]
-                    rel_weight = self.graph[from_mid][to_mid]
+                for from_mid, to_mid, rel_weight in path:
                     rel_label = RELATIONSHIP_LABELS.get(rel_weight, str(rel_weight))
                     result_path.append((from_mid, to_mid, rel_label))
                 return result_path
-            for to_mid, rel in self.graph.get(curr, {}).items():
-                if to_mid not in visited:
-                    visited.add(to_mid)
-                    queue.append((to_mid, path + [(curr, to_mid)]))
+            if limits is not None and not limits.visit():
+                break
+            for _, to_mid, rel in self._search_edges(curr, visited):
+                if limits is not None and (not limits.allows(rel) or not limits.within_hops(len(path) + 1)):
+                    continue
+                visited.add(to_mid)
+                queue.append((to_mid, path + [(curr, to_mid, rel)]))
+        self._report_traversal("relationship_path", len(visited))
+        if limits is not None:
+            limits.search_ended(found=False)
         return None
 
     # === Utility ===
     def get_person(self, mid: str) -> Optional[Person]:
         return self.persons.get(mid)
 
-    def get_relationship_type(self, mid1: str, mid2: str) -> Optional[str]:
+    def get_relationship_type(self, mid1: str, mid2: str, limits: Optional[TraversalLimits] = None) -> Optional[str]:
         """
         Returns the specific relationship type between two people.
         Returns None if no relationship found.
@@ -448,7 +873,7 @@ class FamilyTree:
             return "self"
             
         # Get the shortest path between them
-        path = self.get_relationship_path(mid1, mid2)
+        path = self.get_relationship_path(mid1, mid2, limits)
         if not path:
             return None
             
@@ -528,11 +953,11 @@ class FamilyTree:
             elif down_count > 2:
                 return f"{'great-' * (down_count - 2)}grandson" if person2.gender == "M" else f"{'great-' * (down_count - 2)}granddaughter"
             else:
-            return "distant relative"
+                return "distant relative"
         
         return "relative"
     
-    def get_relationship_with_path(self, mid1: str, mid2: str) -> Dict[str, Any]:
+    def get_relationship_with_path(self, mid1: str, mid2: str, limits: Optional[TraversalLimits] = None) -> Dict[str, Any]:
         """
         Get relationship type and path for complex relationships.
         Returns: {"relationship": "relationship_type", "path": "relationship_path_description"}
@@ -545,7 +970,7 @@ class FamilyTree:
             return {"relationship": "self", "path": "same person"}
             
         # Get the shortest path between them
-        path = self.get_relationship_path(mid1, mid2)
+        path = self.get_relationship_path(mid1, mid2, limits)
         if not path:
             return {"relationship": None, "path": None}
             
@@ -567,7 +992,7 @@ class FamilyTree:
     def _describe_relationship_path(self, mid1: str, mid2: str, path: List[Tuple[str, str, str]]) -> str:
         """Create a human-readable description of the relationship path."""
         if not path:
-        return None
+            return None
             
         person1 = self.persons[mid1]
         person2 = self.persons[mid2]
@@ -595,20 +1020,20 @@ class FamilyTree:
         
         return " → ".join(path_steps)
     
-    def get_bidirectional_relationship(self, mid1: str, mid2: str) -> Dict[str, str]:
+    def get_bidirectional_relationship(self, mid1: str, mid2: str, limits: Optional[TraversalLimits] = None) -> Dict[str, str]:
         """
         Get relationship in both directions.
         Returns: {"forward": "relationship from mid1 to mid2", "reverse": "relationship from mid2 to mid1"}
         """
-        forward = self.get_relationship_type(mid1, mid2)
-        reverse = self.get_relationship_type(mid2, mid1)
+        forward = self.get_relationship_type(mid1, mid2, limits)
+        reverse = self.get_relationship_type(mid2, mid1, limits)
         
         return {
             "forward": forward,
             "reverse": reverse
         }
     
-    def get_detailed_relationship_info(self, mid1: str, mid2: str) -> Dict[str, Any]:
+    def get_detailed_relationship_info(self, mid1: str, mid2: str, limits: Optional[TraversalLimits] = None) -> Dict[str, Any]:
         """
         Get comprehensive relationship information between two people.
         """
@@ -619,13 +1044,13 @@ class FamilyTree:
         person2 = self.persons[mid2]
         
         # Get basic relationship
-        relationship = self.get_relationship_type(mid1, mid2)
+        relationship = self.get_relationship_type(mid1, mid2, limits)
         
         # Get common ancestors
-        common_ancestors = self.get_common_ancestors(mid1, mid2)
+        common_ancestors = self.get_common_ancestors(mid1, mid2, limits)
         
         # Get relationship path
-        path = self.get_relationship_path(mid1, mid2)
+        path = self.get_relationship_path(mid1, mid2, limits)
         
         # Check if they are related at all
         is_related = relationship is not None and relationship != "self"
@@ -637,7 +1062,20 @@ class FamilyTree:
             "is_related": is_related,
             "common_ancestors": [p.to_dict() for p in common_ancestors],
             "relationship_path": path,
-            "bidirectional": self.get_bidirectional_relationship(mid1, mid2)
+            "bidirectional": self.get_bidirectional_relationship(mid1, mid2, limits)
+        }
+
+    def get_kinship_matrix(self, mids: Optional[List[str]] = None) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        Relationship type for every ordered pair of the given members
+        (all members if none are given). Returns {mid1: {mid2: relationship}}.
+        """
+        if mids is None:
+            mids = list(self.persons)
+        mids = [m for m in mids if m in self.persons]
+        return {
+            mid1: {mid2: self.get_relationship_type(mid1, mid2) for mid2 in mids if mid2 != mid1}
+            for mid1 in mids
         }
 
     def detect_ancestry_cycles(self) -> List[List[str]]:
@@ -0,0 +1,120 @@
+from __future__ import annotations
+from typing import Dict, Any, Callable, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
+import time
+import uuid
+
+
+class PoolBusyError(Exception):
+    """Raised when the pool already has its maximum number of pending tasks."""
+
+
+class QueryTimeoutError(Exception):
+    """Raised when an offloaded query does not finish within its timeout."""
+
+
+class JobPool:
+    """
+    Bounded worker pool for CPU-heavy tree work.
+
+    run() executes a callable on a worker and waits at most `timeout` seconds
+    for it; submit_job() starts a background job whose status is polled later.
+    At most `max_pending` tasks may be queued or running at once, so a burst
+    of heavy requests is rejected instead of piling up behind the workers.
+
+    A finished job's result is handed to its owner once and then released;
+    finished jobs are forgotten after `result_ttl` seconds, or sooner beyond
+    the newest `max_finished_jobs`.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 32, max_finished_jobs: int = 256,
+                 result_ttl: float = 600.0, name: str = "tree-job"):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._max_finished_jobs = max_finished_jobs
+        self._result_ttl = result_ttl
+
+    def _submit(self, fn: Callable[[], Any]):
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusyError()
+        try:
+            future = self._executor.submit(fn)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Run fn on the pool and return its result, or raise QueryTimeoutError."""
+        future = self._submit(fn)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Threads cannot be interrupted; a task that has not started yet is dropped
+            future.cancel()
+            raise QueryTimeoutError()
+
+    # === Async Jobs ===
+    def submit_job(self, owner: str, kind: str, fn: Callable[[], Any]) -> str:
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "owner": owner,
+            "kind": kind,
+            "status": "queued",
+            "created_at": time.time(),
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+
+        def task():
+            job["status"] = "running"
+            try:
+                job["result"] = fn()
+                job["status"] = "done"
+            except Exception as e:
+                job["error"] = str(e)
+                job["status"] = "failed"
+            finally:
+                job["finished_at"] = time.time()
+                self._prune()
+
+        self._prune()
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._submit(task)
+        except PoolBusyError:
+            with self._lock:
+                del self._jobs[job_id]
+            raise
+        return job_id
+
+    def get_job(self, owner: str, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of one of owner's jobs; a finished result is returned once, then released."""
+        self._prune()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["owner"] != owner:
+                return None
+            view = {k: v for k, v in job.items() if k != "owner"}
+            if job["status"] == "done" and not job.get("collected"):
+                job["result"] = None
+                job["collected"] = True
+            return view
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than result_ttl and the oldest beyond max_finished_jobs."""
+        expired_before = time.time() - self._result_ttl
+        with self._lock:
+            finished = [jid for jid, job in self._jobs.items() if job["status"] in ("done", "failed")]
+            excess = max(0, len(finished) - self._max_finished_jobs)
+            for i, jid in enumerate(finished):
+                if i < excess or self._jobs[jid]["finished_at"] < expired_before:
+                    del self._jobs[jid]
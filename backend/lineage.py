@@ -0,0 +1,182 @@
+"""
+Per-member lineage aggregates for a FamilyTree:
+
+- descendants: number of distinct descendants. Under pedigree collapse a
+  descendant reachable through several lines is counted once.
+- lineage_depth: generations of recorded descendants below the member
+  (0 when childless).
+- generation: generations of recorded ancestors above the member
+  (0 for founders).
+
+build() computes all three for the whole tree in one topological pass.
+Distinct descendant sets are kept as offset bitsets over a depth-first
+numbering of the members, so a family line occupies a narrow run of bits,
+and each set is freed once all of its member's parents have consumed it.
+FamilyTree then keeps the values current through parent_link_changed().
+
+Members caught in an ancestry cycle have no meaningful values and get None.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Set, Tuple, Any
+from collections import deque
+
+PARENT = 13  # graph[child][parent]
+CHILD = 14  # graph[parent][child]
+
+# Past this many members below a changed edge, re-checking each one's
+# ancestry costs more than a recount, so the descendant counts go stale.
+MAX_INCREMENTAL_SUBTREE = 256
+
+
+class LineageAggregates:
+    def __init__(self, graph: Dict[str, Dict[str, int]]):
+        self.graph = graph
+        self.descendants: Dict[str, Optional[int]] = {}
+        self.lineage_depth: Dict[str, Optional[int]] = {}
+        self.generation: Dict[str, Optional[int]] = {}
+        self.stale = False  # descendant counts need a rebuild
+
+    def _parents(self, mid: str) -> List[str]:
+        return [p for p, rel in self.graph.get(mid, {}).items() if rel == PARENT]
+
+    def _children(self, mid: str) -> List[str]:
+        return [c for c, rel in self.graph.get(mid, {}).items() if rel == CHILD]
+
+    @classmethod
+    def build(cls, graph: Dict[str, Dict[str, int]], mids) -> LineageAggregates:
+        agg = cls(graph)
+        mids = list(mids)
+        parents = {mid: agg._parents(mid) for mid in mids}
+        children = {mid: agg._children(mid) for mid in mids}
+
+        # Kahn's algorithm from the founders; whatever is left over sits on a cycle
+        pending = {mid: len(parents[mid]) for mid in mids}
+        order = [mid for mid in mids if pending[mid] == 0]
+        for mid in order:  # order grows while we iterate
+            for child in children[mid]:
+                if child in pending:
+                    pending[child] -= 1
+                    if pending[child] == 0:
+                        order.append(child)
+        for mid in mids:
+            agg.descendants[mid] = agg.lineage_depth[mid] = agg.generation[mid] = None
+
+        for mid in order:
+            agg.generation[mid] = max((agg.generation[p] + 1 for p in parents[mid]), default=0)
+
+        # Depth-first numbering so each line of descent gets nearby bits
+        index: Dict[str, int] = {}
+        for root in order:
+            if parents[root]:
+                continue
+            stack = [root]
+            while stack:
+                mid = stack.pop()
+                if mid in index:
+                    continue
+                index[mid] = len(index)
+                stack.extend(c for c in children[mid] if c not in index)
+
+        # Children before parents; a set is dropped once its last parent has read it
+        sets: Dict[str, Tuple[int, int]] = {}  # mid -> (lowest index, bits above it)
+        readers = {mid: len(parents[mid]) for mid in order}
+        for mid in reversed(order):
+            lo, bits = index[mid], 1  # the member itself, removed from the count below
+            depth = 0
+            for child in children[mid]:
+                if child not in sets:
+                    continue  # child on a cycle
+                clo, cbits = sets[child]
+                if clo < lo:
+                    bits, lo = (bits << (lo - clo)) | cbits, clo
+                else:
+                    bits |= cbits << (clo - lo)
+                depth = max(depth, agg.lineage_depth[child] + 1)
+                readers[child] -= 1
+                if readers[child] == 0:
+                    del sets[child]
+            agg.descendants[mid] = bits.bit_count() - 1
+            agg.lineage_depth[mid] = depth
+            if readers[mid]:
+                sets[mid] = (lo, bits)
+        return agg
+
+    # === Incremental maintenance ===
+    def _ancestors(self, mid: str, skip: Tuple[str, str]) -> Set[str]:
+        """Ancestors of mid, ignoring the child->parent edge `skip`."""
+        seen: Set[str] = set()
+        queue = deque([mid])
+        while queue:
+            curr = queue.popleft()
+            for parent in self._parents(curr):
+                if (curr, parent) != skip and parent not in seen:
+                    seen.add(parent)
+                    queue.append(parent)
+        return seen
+
+    def _closure(self, mid: str, step, limit: Optional[int] = None) -> Optional[Set[str]]:
+        seen = {mid}
+        queue = deque([mid])
+        while queue:
+            for nxt in step(queue.popleft()):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    if limit is not None and len(seen) > limit:
+                        return None
+                    queue.append(nxt)
+        return seen
+
+    def _propagate(self, start: str, values: Dict[str, Optional[int]], inputs, outputs) -> None:
+        """Recompute 1 + max(values of inputs) from start, following outputs while values change."""
+        budget = 4 * len(values) + 16  # an ancestry cycle would otherwise never settle
+        queue = deque([start])
+        while queue:
+            budget -= 1
+            if budget < 0:
+                self.stale = True
+                return
+            mid = queue.popleft()
+            known = [values.get(m) for m in inputs(mid)]
+            new = None if None in known else max((v + 1 for v in known), default=0)
+            if values.get(mid, -1) != new:
+                values[mid] = new
+                queue.extend(outputs(mid))
+
+    def parent_link_changed(self, child: str, parent: str, added: bool) -> None:
+        """Update after the child->parent edge was added to or removed from the graph."""
+        self.generation.setdefault(child, 0)
+        self.lineage_depth.setdefault(parent, 0)
+        self._propagate(child, self.generation, self._parents, self._children)
+        self._propagate(parent, self.lineage_depth, self._children, self._parents)
+        if self.stale:
+            return
+
+        below = self._closure(child, self._children, MAX_INCREMENTAL_SUBTREE)
+        if below is None:
+            self.stale = True
+            return
+        above = self._closure(parent, self._parents)
+        # A member below the edge moves in or out of an ancestor's count only if
+        # that ancestor does not reach it through another line as well
+        sign = 1 if added else -1
+        for mid in below:
+            other_lines = self._ancestors(mid, skip=(child, parent))
+            for anc in above:
+                if anc not in other_lines and self.descendants.get(anc) is not None:
+                    self.descendants[anc] += sign
+
+    def add_member(self, mid: str) -> None:
+        self.descendants[mid] = self.lineage_depth[mid] = self.generation[mid] = 0
+
+    def remove_member(self, mid: str) -> None:
+        """Forget a member whose parent and child links were already removed."""
+        self.descendants.pop(mid, None)
+        self.lineage_depth.pop(mid, None)
+        self.generation.pop(mid, None)
+
+    def get(self, mid: str) -> Dict[str, Any]:
+        return {
+            "descendants": self.descendants.get(mid),
+            "lineage_depth": self.lineage_depth.get(mid),
+            "generation": self.generation.get(mid),
+        }
@@ -0,0 +1,126 @@
+from __future__ import annotations
+from typing import Dict, Any
+from contextlib import contextmanager
+import threading
+import time
+
+
+class RWLock:
+    """
+    Writer-preferring reader-writer lock.
+    Any number of readers may hold the lock at once; a writer holds it alone.
+    Once a writer is waiting, new readers queue behind it so a steady stream
+    of kinship queries cannot starve mutations.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+        self._stats = {
+            "read_acquires": 0,
+            "write_acquires": 0,
+            "read_contended": 0,
+            "write_contended": 0,
+            "read_wait_seconds": 0.0,
+            "write_wait_seconds": 0.0,
+            "max_concurrent_readers": 0,
+        }
+
+    def acquire_read(self) -> None:
+        with self._cond:
+            waited = 0.0
+            if self._writer or self._writers_waiting:
+                self._stats["read_contended"] += 1
+                start = time.perf_counter()
+                while self._writer or self._writers_waiting:
+                    self._cond.wait()
+                waited = time.perf_counter() - start
+            self._readers += 1
+            self._stats["read_acquires"] += 1
+            self._stats["read_wait_seconds"] += waited
+            if self._readers > self._stats["max_concurrent_readers"]:
+                self._stats["max_concurrent_readers"] = self._readers
+
+    def release_read(self) -> None:
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        with self._cond:
+            waited = 0.0
+            if self._writer or self._readers:
+                self._stats["write_contended"] += 1
+                start = time.perf_counter()
+                self._writers_waiting += 1
+                try:
+                    while self._writer or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._writers_waiting -= 1
+                waited = time.perf_counter() - start
+            self._writer = True
+            self._stats["write_acquires"] += 1
+            self._stats["write_wait_seconds"] += waited
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            data = dict(self._stats)
+            data["active_readers"] = self._readers
+            data["writer_active"] = self._writer
+            data["writers_waiting"] = self._writers_waiting
+            return data
+
+
+class LockRegistry:
+    """Hands out one RWLock per key (e.g. per username's tree)."""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks: Dict[str, RWLock] = {}
+
+    def get(self, key: str) -> RWLock:
+        with self._guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = RWLock()
+            return lock
+
+    def stats(self) -> Dict[str, Any]:
+        with self._guard:
+            locks = dict(self._locks)
+        per_key = {key: lock.stats() for key, lock in locks.items()}
+        totals: Dict[str, Any] = {}
+        for key_stats in per_key.values():
+            for name, value in key_stats.items():
+                if isinstance(value, bool):
+                    continue
+                if name.startswith("max_"):
+                    totals[name] = max(totals.get(name, 0), value)
+                else:
+                    totals[name] = totals.get(name, 0) + value
+        return {"trees": len(per_key), "totals": totals, "per_tree": per_key}
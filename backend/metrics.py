@@ -0,0 +1,186 @@
+"""
+In-process counters, gauges and histograms rendered in the Prometheus text
+exposition format, plus a sampling request profiler.
+"""
+from __future__ import annotations
+from typing import Dict, List, Any, Tuple, Optional, Callable
+from collections import deque
+from contextlib import contextmanager
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+
+# Latency buckets in seconds (Prometheus client defaults)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets for node-visit counts of graph traversals
+COUNT_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}  # bucket counts + [sum, count]
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        with self._lock:
+            self._help[name] = (kind, help_text)
+            if kind == "histogram":
+                self._buckets[name] = buckets
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            buckets = self._buckets.setdefault(name, DEFAULT_BUCKETS)
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        """Render every series in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(store.items()):
+                    lines.append(f"# HELP {name} {self._help.get(name, (kind, name))[1]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                buckets = self._buckets[name]
+                lines.append(f"# HELP {name} {self._help.get(name, ('histogram', name))[1]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, state in sorted(series.items()):
+                    # Observations were counted into every bucket they fit, so counts are cumulative
+                    for i, bound in enumerate(buckets):
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', str(bound)))} {state[i]}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {state[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Profiles a random sample of requests with cProfile and keeps the report
+    of each sampled request that turned out slower than `slow_seconds`.
+    Only one request is profiled at a time. cProfile follows a single thread,
+    so work the request hands to a pool runs through run_in_thread() and its
+    profile is merged into the request's report.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, slow_seconds: float = 1.0, keep: int = 20):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.reports = deque(maxlen=keep)
+        self._active = threading.Lock()
+        self._current: Optional[cProfile.Profile] = None
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._threads_lock = threading.Lock()
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        if not self._active.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool is already attached to the interpreter
+            self._active.release()
+            return None
+        with self._threads_lock:
+            self._current = profiler
+            self._thread_profiles = []
+        return profiler
+
+    def run_in_thread(self, request_profiler: cProfile.Profile, fn: Callable[[], Any]) -> Any:
+        """Run fn on the calling (worker) thread, profiled as part of request_profiler's request."""
+        thread_profiler = cProfile.Profile()
+        try:
+            thread_profiler.enable()
+        except ValueError:
+            # Interpreter-wide profiling (Python 3.12+) already covers this thread
+            return fn()
+        try:
+            return fn()
+        finally:
+            thread_profiler.disable()
+            with self._threads_lock:
+                # A task outliving its request must not leak into the next report
+                if self._current is request_profiler:
+                    self._thread_profiles.append(thread_profiler)
+
+    def stop(self, profiler: cProfile.Profile, label: str, elapsed: float) -> None:
+        profiler.disable()
+        with self._threads_lock:
+            thread_profiles, self._thread_profiles = self._thread_profiles, []
+            self._current = None
+        self._active.release()
+        if elapsed < self.slow_seconds:
+            return
+        out = io.StringIO()
+        pstats.Stats(profiler, *thread_profiles, stream=out).sort_stats("cumulative").print_stats(30)
+        self.reports.append({
+            "route": label,
+            "elapsed_seconds": elapsed,
+            "timestamp": time.time(),
+            "profile": out.getvalue(),
+        })
+
+
+metrics = Metrics()
+metrics.describe("http_request_duration_seconds", "histogram", "Request latency by route, method and status.")
+metrics.describe("tree_stage_duration_seconds", "histogram", "Time spent in tree hydration, serialisation, checkpoints, writes and queries.")
+metrics.describe("traversal_nodes_visited", "histogram", "Nodes visited per graph traversal.", COUNT_BUCKETS)
+metrics.describe("tree_cache_requests_total", "counter", "Tree cache lookups by result (hit, stale, miss).")
+metrics.describe("db_round_trips_total", "counter", "MongoDB commands issued, by command name.")
+metrics.describe("db_command_duration_seconds", "histogram", "MongoDB command latency by command name.")
@@ -0,0 +1,232 @@
+"""
+Append-only operation log for a FamilyTree with undo/redo and checkpoints.
+
+Every mutation goes through OpLog.apply(), which runs the FamilyTree method
+with journaling on and appends an entry holding, for each member touched,
+its image (person record and edge row) before and after the operation:
+
+    {"version": 7, "op": "add_relationship", "args": [...], "ts": ...,
+     "changes": [[mid, before_image, after_image], ...]}
+
+Replaying an entry writes its after-images; undoing one writes its
+before-images, so both cost as much as the operation touched, however
+long the history. Undo and redo are themselves appended as entries
+("target" names the entry undone or redone) so the log stays append-only
+and any reader can replay it.
+
+Every `checkpoint_interval` versions a binary snapshot is kept; a past
+version is rebuilt from the nearest checkpoint at or below it plus the
+entries after that. Entries older than the oldest retained checkpoint are
+compacted away.
+"""
+from __future__ import annotations
+from typing import Dict, List, Any, Optional, Iterable, Tuple, Callable
+from collections import deque
+import time
+
+from family_tree import Person, FamilyTree
+import snapshot
+
+
+def _describe(value: Any) -> Any:
+    """JSON-friendly form of an operation argument, for the log record only."""
+    if isinstance(value, Person):
+        return value.to_dict()
+    if isinstance(value, FamilyTree):
+        return {"members": len(value.persons)}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_describe(v) for v in value]
+    return str(value)
+
+
+def entry_mids(entry: Dict[str, Any]) -> List[str]:
+    return [mid for mid, _, _ in entry["changes"]]
+
+
+class OpLog:
+    # Optional hook called as checkpoint_observer(seconds) after each snapshot checkpoint
+    checkpoint_observer: Optional[Callable[[float], None]] = None
+
+    def __init__(self, version: int = 0, checkpoint: Optional[bytes] = None, checkpoint_interval: int = 100,
+                 keep_checkpoints: int = 5, max_undo: int = 1000, checkpoint_stored: bool = True):
+        self.version = version
+        self.persisted_version = version  # entries above this still need writing out
+        # A base checkpoint that storage does not hold yet (e.g. a tree saved
+        # before the op log existed) goes out with the next save
+        self._unstored_base = version if checkpoint is not None and not checkpoint_stored else None
+        self.checkpoint_interval = checkpoint_interval
+        self.keep_checkpoints = keep_checkpoints
+        self.entries: deque = deque()  # every entry after the oldest retained checkpoint
+        self.checkpoints: Dict[int, bytes] = {}  # version -> snapshot
+        if checkpoint is not None:
+            self.checkpoints[version] = checkpoint
+        self._undo: deque = deque(maxlen=max_undo)
+        self._redo: List[Dict[str, Any]] = []
+
+    # === Recording ===
+    def apply(self, tree: FamilyTree, op: str, *args, **kwargs) -> Any:
+        """
+        Run tree.<op>(*args, **kwargs) and log its effect. If the method
+        raises, the members it already touched are restored before re-raising.
+        """
+        tree.begin_journal()
+        try:
+            result = getattr(tree, op)(*args, **kwargs)
+        except Exception:
+            for mid, image in tree.end_journal().items():
+                tree.restore_member(mid, image)
+            raise
+        before = tree.end_journal()
+        if before:
+            changes = [[mid, image, tree.member_image(mid)] for mid, image in before.items()]
+            entry = self._append(tree, op, _describe(list(args) + ([kwargs] if kwargs else [])), changes)
+            self._undo.append(entry)
+            self._redo.clear()
+        return result
+
+    def _append(self, tree: FamilyTree, op: str, args: Any, changes: List[List[Any]],
+                target: Optional[int] = None, ts: Optional[float] = None) -> Dict[str, Any]:
+        self.version += 1
+        entry = {"version": self.version, "op": op, "args": args, "changes": changes,
+                 "ts": ts if ts is not None else time.time()}
+        if target is not None:
+            entry["target"] = target
+        self.entries.append(entry)
+        if self.version % self.checkpoint_interval == 0:
+            self._checkpoint(tree)
+        return entry
+
+    def _checkpoint(self, tree: FamilyTree) -> None:
+        start = time.perf_counter()
+        self.checkpoints[self.version] = snapshot.dumps(tree)
+        observer = OpLog.checkpoint_observer
+        if observer is not None:
+            observer(time.perf_counter() - start)
+        kept = sorted(self.checkpoints)
+        for old in kept[:-self.keep_checkpoints]:
+            del self.checkpoints[old]
+        # Entries at or below the oldest checkpoint can no longer be needed for a
+        # rebuild, but unsaved ones stay until they are persisted
+        oldest = min(min(self.checkpoints), self.persisted_version)
+        while self.entries and self.entries[0]["version"] <= oldest:
+            self.entries.popleft()
+
+    # === Undo / Redo ===
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def undo(self, tree: FamilyTree) -> Optional[Dict[str, Any]]:
+        """Revert the latest undoable operation; returns the logged undo entry, or None."""
+        if not self._undo:
+            return None
+        target = self._undo.pop()
+        changes = [[mid, after, before] for mid, before, after in target["changes"]]
+        self._write(tree, changes)
+        self._redo.append(target)
+        return self._append(tree, "undo", [target["op"]], changes, target=target["version"])
+
+    def redo(self, tree: FamilyTree) -> Optional[Dict[str, Any]]:
+        if not self._redo:
+            return None
+        target = self._redo.pop()
+        self._write(tree, target["changes"])
+        self._undo.append(target)
+        return self._append(tree, "redo", [target["op"]], target["changes"], target=target["version"])
+
+    # === Replay ===
+    @staticmethod
+    def _write(tree: FamilyTree, changes: Iterable[List[Any]]) -> None:
+        for mid, _, after in changes:
+            tree.restore_member(mid, after)
+
+    def replay(self, tree: FamilyTree, entry: Dict[str, Any]) -> None:
+        """Apply an entry read back from storage, keeping the undo/redo stacks in step."""
+        if entry["version"] != self.version + 1:
+            raise ValueError(f"Expected log entry {self.version + 1}, got {entry['version']}.")
+        self._write(tree, entry["changes"])
+        target = entry.get("target")
+        if entry["op"] == "undo":
+            if self._undo and self._undo[-1]["version"] == target:
+                self._redo.append(self._undo.pop())
+        elif entry["op"] == "redo":
+            if self._redo and self._redo[-1]["version"] == target:
+                self._undo.append(self._redo.pop())
+        logged = self._append(tree, entry["op"], entry["args"], entry["changes"], target=target, ts=entry.get("ts"))
+        if entry["op"] not in ("undo", "redo"):
+            self._undo.append(logged)
+            self._redo.clear()
+        self.persisted_version = self.version
+
+    def tree_at(self, version: int) -> FamilyTree:
+        """Rebuild the tree as it stood at `version` from the nearest retained checkpoint."""
+        if version > self.version:
+            raise ValueError(f"Version {version} does not exist yet.")
+        base = max((v for v in self.checkpoints if v <= version), default=None)
+        if base is None:
+            raise ValueError(f"Version {version} is older than the retained history.")
+        return rebuild(self.checkpoints[base], (e for e in self.entries if base < e["version"] <= version))
+
+    # === Persistence ===
+    def unpersisted(self) -> List[Dict[str, Any]]:
+        return [e for e in self.entries if e["version"] > self.persisted_version]
+
+    def pending_checkpoints(self) -> Dict[int, bytes]:
+        return {v: data for v, data in self.checkpoints.items()
+                if v > self.persisted_version or v == self._unstored_base}
+
+    def mark_persisted(self) -> None:
+        self.persisted_version = self.version
+        self._unstored_base = None
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest-first summaries of the retained entries, without member images."""
+        out = []
+        for entry in reversed(self.entries):
+            if len(out) >= limit:
+                break
+            summary = {k: v for k, v in entry.items() if k != "changes"}
+            summary["members"] = entry_mids(entry)
+            out.append(summary)
+        return out
+
+
+def replay_entries(tree: FamilyTree, entries: Iterable[Dict[str, Any]]) -> FamilyTree:
+    """Write the after-images of the given entries onto tree, in order."""
+    for entry in entries:
+        OpLog._write(tree, entry["changes"])
+    return tree
+
+
+def rebuild(checkpoint: bytes, entries: Iterable[Dict[str, Any]]) -> FamilyTree:
+    """A checkpoint snapshot with the after-images of the given entries applied in order."""
+    tree = replay_entries(snapshot.loads(checkpoint), entries)
+    tree.take_dirty()
+    return tree
+
+
+# === Stored trees ===
+def stored_versions(doc: Dict[str, Any]) -> Tuple[int, int]:
+    """(checkpoint version, current version) of a trees collection document."""
+    version = doc.get("tree_version", 0)
+    # Documents written before the op log existed hold a snapshot of the current version
+    return doc.get("checkpoint_version", version), version
+
+
+def stored_checkpoint(doc: Dict[str, Any]) -> FamilyTree:
+    """The tree at a document's checkpoint version, from its snapshot or legacy JSON dict."""
+    if doc.get("tree_snapshot"):
+        return snapshot.loads(bytes(doc["tree_snapshot"]))
+    return FamilyTree().from_dict(doc.get("tree") or {})
+
+
+def ops_after_checkpoint(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Filter for the op log entries a document's checkpoint does not include yet."""
+    base, version = stored_versions(doc)
+    return {"username": doc["username"], "version": {"$gt": base, "$lte": version}}
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from typing import Dict, Set, List, Tuple, Iterable
+from collections import defaultdict
+import bisect
+import heapq
+import unicodedata
+
+
+def normalize(text: str) -> str:
+    """Lower-case and strip accents so "José" matches "jose"."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MemberSearchIndex:
+    """
+    Name search over the members of one FamilyTree.
+
+    Prefix lookups use a sorted list of (token, mid) pairs, where the tokens
+    of a name are its full normalised form plus each word, so "ann" finds
+    both "Anna Smith" and "Mary Annabel". Fuzzy lookups use an inverted
+    trigram index scored by Dice similarity. FamilyTree keeps the index up to
+    date through add()/remove(). Trigrams point at distinct names rather
+    than members, so common names are scored once however many share them.
+    """
+
+    def __init__(self):
+        self._tokens: List[Tuple[str, str]] = []  # sorted (token, mid)
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)  # trigram -> normalised names
+        self._holders: Dict[str, Set[str]] = {}  # normalised name -> mids
+        self._names: Dict[str, str] = {}  # mid -> normalised name as indexed
+
+    @classmethod
+    def build(cls, members: Iterable[Tuple[str, str]]) -> MemberSearchIndex:
+        """Index (mid, name) pairs in one pass, sorting the token list once."""
+        index = cls()
+        for mid, name in members:
+            norm = normalize(name)
+            index._names[mid] = norm
+            index._tokens.extend((token, mid) for token in cls._tokens_for(norm))
+            index._add_holder(norm, mid)
+        index._tokens.sort()
+        return index
+
+    def _add_holder(self, norm: str, mid: str) -> None:
+        holders = self._holders.get(norm)
+        if holders is None:
+            holders = self._holders[norm] = set()
+            for gram in trigrams(norm):
+                self._trigrams[gram].add(norm)
+        holders.add(mid)
+
+    def _remove_holder(self, norm: str, mid: str) -> None:
+        holders = self._holders.get(norm)
+        if holders is None:
+            return
+        holders.discard(mid)
+        if not holders:
+            del self._holders[norm]
+            for gram in trigrams(norm):
+                names = self._trigrams.get(gram)
+                if names is not None:
+                    names.discard(norm)
+                    if not names:
+                        del self._trigrams[gram]
+
+    @staticmethod
+    def _tokens_for(name: str) -> Set[str]:
+        return {name} | set(name.split())
+
+    def add(self, mid: str, name: str) -> None:
+        if mid in self._names:
+            self.remove(mid)
+        norm = normalize(name)
+        self._names[mid] = norm
+        for token in self._tokens_for(norm):
+            bisect.insort(self._tokens, (token, mid))
+        self._add_holder(norm, mid)
+
+    def remove(self, mid: str) -> None:
+        norm = self._names.pop(mid, None)
+        if norm is None:
+            return
+        for token in self._tokens_for(norm):
+            i = bisect.bisect_left(self._tokens, (token, mid))
+            if i < len(self._tokens) and self._tokens[i] == (token, mid):
+                del self._tokens[i]
+        self._remove_holder(norm, mid)
+
+    def prefix_matches(self, prefix: str) -> Dict[str, float]:
+        """mid -> score: 3.0 exact name, 2.0 full-name prefix, 1.5 prefix of one word."""
+        prefix = normalize(prefix)
+        scores: Dict[str, float] = {}
+        if not prefix:  # every token would match
+            return scores
+        i = bisect.bisect_left(self._tokens, (prefix, ""))
+        while i < len(self._tokens) and self._tokens[i][0].startswith(prefix):
+            token, mid = self._tokens[i]
+            if self._names[mid] == prefix:
+                score = 3.0
+            elif token == self._names[mid]:
+                score = 2.0
+            else:
+                score = 1.5
+            scores[mid] = max(scores.get(mid, 0.0), score)
+            i += 1
+        return scores
+
+    def fuzzy_matches(self, query: str, min_similarity: float = 0.3) -> Dict[str, float]:
+        """mid -> Dice similarity of trigram sets, for names at least min_similarity alike."""
+        grams = trigrams(normalize(query))
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for norm in self._trigrams.get(gram, ()):
+                shared[norm] += 1
+        scores = {}
+        for norm, count in shared.items():
+            similarity = 2.0 * count / (len(grams) + len(trigrams(norm)))
+            if similarity >= min_similarity:
+                for mid in self._holders[norm]:
+                    scores[mid] = similarity
+        return scores
+
+    def search(self, query: str, fuzzy: bool = True, limit: int = 10,
+               accept=None) -> List[Tuple[str, float]]:
+        """
+        Top `limit` (mid, score) pairs for query, best first. Prefix matches
+        always outrank fuzzy ones; `accept(mid)` can reject candidates (e.g.
+        attribute filters) before ranking.
+        """
+        if not normalize(query):
+            return []
+        scores = self.prefix_matches(query)
+        if fuzzy:
+            for mid, similarity in self.fuzzy_matches(query).items():
+                if mid not in scores:
+                    scores[mid] = similarity
+        candidates = ((mid, score) for mid, score in scores.items() if accept is None or accept(mid))
+        return heapq.nsmallest(limit, candidates, key=lambda item: (-item[1], self._names[item[0]], item[0]))
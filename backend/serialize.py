@@ -0,0 +1,97 @@
+"""
+Direct JSON encoding of members and edges for HTTP responses.
+
+The generic path turns every Person into a dict and hands the list to the
+stdlib encoder with sorted keys, which dominates the cost of large member
+lists. The encoders here write each record from a fixed template instead,
+escaping strings with the C-accelerated json.encoder.encode_basestring, and
+return UTF-8 bytes ready to send. Output is the same JSON as
+Person.to_dict() / FamilyTree.to_dict() (keys in declaration order, no
+whitespace, non-ASCII left unescaped).
+
+compress() applies gzip, or Brotli when the optional `brotli` package is
+installed, for responses above a size threshold chosen by the caller.
+"""
+from __future__ import annotations
+from typing import Dict, List, Any, Iterable, Tuple
+from json.encoder import encode_basestring
+import gzip
+import json
+
+from family_tree import Person, FamilyTree
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Content-Encodings compress() supports, most preferred first
+ENCODINGS: Tuple[str, ...] = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def _value(value: Any) -> str:
+    # Fast path for the types the templates expect; anything else goes through json
+    if type(value) is str:
+        return encode_basestring(value)
+    if type(value) is int:
+        return str(value)
+    if value is None:
+        return "null"
+    return json.dumps(value, ensure_ascii=False)
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON for any other payload."""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _person_json(p: Person) -> str:
+    mid, name, gender, age = p.mid, p.name, p.gender, p.age
+    if type(mid) is str and type(name) is str and type(gender) is str and type(age) is int:
+        return (f'{{"mid":{encode_basestring(mid)},"name":{encode_basestring(name)},'
+                f'"gender":{encode_basestring(gender)},"age":{age}}}')
+    return f'{{"mid":{_value(mid)},"name":{_value(name)},"gender":{_value(gender)},"age":{_value(age)}}}'
+
+
+def encode_person(person: Person) -> bytes:
+    return _person_json(person).encode("utf-8")
+
+
+def encode_persons(persons: Iterable[Person]) -> bytes:
+    """JSON array of Person.to_dict() records."""
+    return ("[" + ",".join([_person_json(p) for p in persons]) + "]").encode("utf-8")
+
+
+def _edges_json(rows: Iterable[Tuple[str, Dict[str, int]]]) -> str:
+    parts: List[str] = []
+    for mid, rels in rows:
+        if not rels:
+            continue
+        prefix = f'{{"from":{_value(mid)},"to":'
+        parts.extend(
+            f'{prefix}{encode_basestring(to_mid) if type(to_mid) is str else _value(to_mid)},'
+            f'"relationship":{rel if type(rel) is int else _value(rel)}}}'
+            for to_mid, rel in rels.items()
+        )
+    return "[" + ",".join(parts) + "]"
+
+
+def encode_edges(rows: Iterable[Tuple[str, Dict[str, int]]]) -> bytes:
+    """JSON array of {"from", "to", "relationship"} for (mid, edge row) pairs."""
+    return _edges_json(rows).encode("utf-8")
+
+
+def encode_tree(tree: FamilyTree) -> bytes:
+    """The FamilyTree.to_dict() document, without building it."""
+    persons = ",".join([_person_json(p) for p in tree.persons.values()])
+    return f'{{"persons":[{persons}],"edges":{_edges_json(tree.graph.items())}}}'.encode("utf-8")
+
+
+def compress(body: bytes, encoding: str, level: int = 5) -> bytes:
+    """Compress a response body with one of ENCODINGS; level is the gzip level (0-9)."""
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == "br" and brotli is not None:
+        # Brotli quality 0-11; map the gzip level onto the fast end of the range
+        return brotli.compress(body, quality=min(11, max(0, level - 1)))
+    raise ValueError(f"Unsupported content encoding {encoding!r}.")
@@ -0,0 +1,204 @@
+"""
+Compact binary snapshots of a FamilyTree.
+
+Layout (all integers little-endian):
+
+    header   magic "FTSN", version u16, flags u16,
+             n_strings u32, n_persons u32, n_edges u32,
+             payload_len u32, crc32(payload) u32
+    payload  string table: (n_strings + 1) u32 offsets, then UTF-8 blob
+             persons:      mid/name/gender string indexes (3 x n_persons u32),
+                           ages (n_persons i32), or with FLAG_JSON_AGES the
+                           string index of each age's JSON text (u32)
+             edges:        from/to string indexes (2 x n_edges u32),
+                           relationship weights (n_edges u8)
+
+Every string (member IDs, names, genders) is stored once in the string table
+and referenced by index, so repeated IDs across edges cost 4 bytes each.
+Loading decodes each section with a single array copy instead of building
+per-edge dicts the way the JSON path does.
+"""
+from __future__ import annotations
+from typing import Dict, List, Any, Union
+from array import array
+from collections import defaultdict
+import json
+import mmap
+import struct
+import sys
+import zlib
+
+from family_tree import Person, FamilyTree
+
+SNAPSHOT_MAGIC = b"FTSN"
+SNAPSHOT_VERSION = 1
+NULL_AGE = -(2 ** 31)  # sentinel for a missing age
+# Set when some age is not an int that fits in an i32 (e.g. legacy "unknown"
+# or 30.5); every age is then stored as JSON text so nothing is truncated
+FLAG_JSON_AGES = 1
+
+_HEADER = struct.Struct("<4sHHIIIII")
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+def _pack(typecode: str, values) -> bytes:
+    arr = array(typecode, values)
+    if _BIG_ENDIAN:
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _unpack(typecode: str, buf, offset: int, count: int) -> array:
+    arr = array(typecode)
+    end = offset + count * arr.itemsize
+    if end > len(buf):
+        raise ValueError("Snapshot is truncated.")
+    arr.frombytes(buf[offset:end])
+    if _BIG_ENDIAN:
+        arr.byteswap()
+    return arr
+
+
+def dumps(tree: FamilyTree) -> bytes:
+    """Encode a FamilyTree as a binary snapshot."""
+    strings: List[str] = []
+    index: Dict[str, int] = {}
+
+    def intern(s: str) -> int:
+        i = index.get(s)
+        if i is None:
+            i = index[s] = len(strings)
+            strings.append(s)
+        return i
+
+    mids, names, genders, ages = [], [], [], []
+    for p in tree.persons.values():
+        mids.append(intern(p.mid))
+        names.append(intern(p.name))
+        genders.append(intern(p.gender))
+        ages.append(p.age)
+
+    flags = 0
+    if all(a is None or (type(a) is int and NULL_AGE < a < 2 ** 31) for a in ages):
+        ages = [NULL_AGE if a is None else a for a in ages]
+    else:
+        flags |= FLAG_JSON_AGES
+        ages = [intern(json.dumps(a)) for a in ages]
+
+    froms, tos, weights = [], [], []
+    for mid1, rels in tree.graph.items():
+        if not rels:
+            continue
+        i = intern(mid1)
+        for mid2, rel in rels.items():
+            froms.append(i)
+            tos.append(intern(mid2))
+            weights.append(rel)
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for b in encoded:
+        offsets.append(offsets[-1] + len(b))
+
+    payload = b"".join([
+        _pack("I", offsets),
+        b"".join(encoded),
+        _pack("I", mids),
+        _pack("I", names),
+        _pack("I", genders),
+        _pack("I" if flags & FLAG_JSON_AGES else "i", ages),
+        _pack("I", froms),
+        _pack("I", tos),
+        bytes(weights),
+    ])
+    header = _HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags,
+        len(strings), len(mids), len(froms),
+        len(payload), zlib.crc32(payload),
+    )
+    return header + payload
+
+
+def loads(buf: Union[bytes, bytearray, memoryview, mmap.mmap], verify: bool = True) -> FamilyTree:
+    """Decode a binary snapshot into a new FamilyTree."""
+    view = memoryview(buf)
+    if len(view) < _HEADER.size:
+        raise ValueError("Snapshot is truncated.")
+    magic, version, flags, n_strings, n_persons, n_edges, payload_len, crc = _HEADER.unpack_from(view, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a family tree snapshot.")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}.")
+    payload = view[_HEADER.size:_HEADER.size + payload_len]
+    if len(payload) != payload_len:
+        raise ValueError("Snapshot is truncated.")
+    if verify and zlib.crc32(payload) != crc:
+        raise ValueError("Snapshot checksum mismatch.")
+
+    pos = 0
+    offsets = _unpack("I", payload, pos, n_strings + 1)
+    pos += len(offsets) * offsets.itemsize
+    blob = bytes(payload[pos:pos + offsets[-1]])
+    pos += offsets[-1]
+    strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(n_strings)]
+
+    sections = []
+    age_code = "I" if flags & FLAG_JSON_AGES else "i"
+    for typecode, count in (("I", n_persons), ("I", n_persons), ("I", n_persons), (age_code, n_persons),
+                            ("I", n_edges), ("I", n_edges)):
+        arr = _unpack(typecode, payload, pos, count)
+        pos += count * arr.itemsize
+        sections.append(arr)
+    mids, names, genders, ages, froms, tos = sections
+    if pos + n_edges > payload_len:
+        raise ValueError("Snapshot is truncated.")
+    weights = payload[pos:pos + n_edges]
+
+    if flags & FLAG_JSON_AGES:
+        ages = [json.loads(strings[a]) for a in ages]
+    else:
+        ages = [None if a == NULL_AGE else a for a in ages]
+
+    tree = FamilyTree()
+    persons = tree.persons
+    for m, n, g, a in zip(mids, names, genders, ages):
+        mid = strings[m]
+        persons[mid] = Person(mid, strings[n], strings[g], a)
+
+    graph = defaultdict(dict)
+    for f, t, w in zip(froms, tos, weights):
+        graph[strings[f]][strings[t]] = w
+    tree.graph = graph
+    return tree
+
+
+def dump(tree: FamilyTree, path: str) -> None:
+    with open(path, "wb") as fh:
+        fh.write(dumps(tree))
+
+
+def load(path: str, verify: bool = True) -> FamilyTree:
+    """Load a snapshot file through a read-only memory map."""
+    with open(path, "rb") as fh:
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return loads(mm, verify=verify)
+
+
+# === JSON Interop ===
+def snapshot_to_dict(buf: Union[bytes, bytearray, memoryview]) -> Dict[str, Any]:
+    return loads(buf).to_dict()
+
+
+def snapshot_from_dict(data: Dict[str, Any]) -> bytes:
+    return dumps(FamilyTree().from_dict(data))
+
+
+def snapshot_to_json(buf: Union[bytes, bytearray, memoryview]) -> str:
+    """Convert a snapshot to the export_to_json() format."""
+    return loads(buf).export_to_json()
+
+
+def snapshot_from_json(json_obj: Union[str, Dict[str, Any]]) -> bytes:
+    """Convert an export_to_json() document to a snapshot."""
+    data = json.loads(json_obj) if isinstance(json_obj, str) else json_obj
+    return snapshot_from_dict(data)
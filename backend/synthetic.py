@@ -0,0 +1,138 @@
+"""
+Deterministic synthetic pedigree generator for benchmarks.
+
+Trees are built generation by generation from founder couples. Each couple
+has a random number of children around `fertility`; children marry with
+probability `marriage_rate`, either someone from outside the tree or (with
+probability `collapse_rate`) an unmarried member of their own generation,
+which produces pedigree collapse. A fraction `divorce_rate` of couples
+divorce and one partner remarries an outsider, giving half-siblings.
+
+Edges follow the same layout as the kinship queries read them:
+graph[child][parent] = 13 (Parent), graph[parent][child] = 14 (Son-Daughter).
+Sibling edges between children of a parent are only written when
+FamilyTree.materialize_siblings is set; otherwise siblings are derived.
+"""
+from __future__ import annotations
+from typing import List, Tuple, Optional
+import random
+
+from family_tree import Person, FamilyTree
+
+FIRST_NAMES_M = ["James", "Arjun", "Luca", "Omar", "Kenji", "Mateo", "Noah", "Ravi", "Ivan", "Leo"]
+FIRST_NAMES_F = ["Asha", "Maria", "Yuki", "Fatima", "Elena", "Priya", "Zoe", "Amara", "Ines", "Mia"]
+SURNAMES = ["Sharma", "Rossi", "Tanaka", "Haddad", "Novak", "Garcia", "Okafor", "Smith", "Kim", "Silva"]
+
+
+class PedigreeGenerator:
+    def __init__(self, seed: int = 0, fertility: float = 2.5, marriage_rate: float = 0.8,
+                 divorce_rate: float = 0.15, collapse_rate: float = 0.05, generation_span: int = 28,
+                 id_prefix: str = "p"):
+        self.rng = random.Random(seed)
+        self.fertility = fertility
+        self.marriage_rate = marriage_rate
+        self.divorce_rate = divorce_rate
+        self.collapse_rate = collapse_rate
+        self.generation_span = generation_span
+        self.id_prefix = id_prefix
+        self.tree = FamilyTree()
+        self._next_id = 0
+
+    def _new_person(self, generation: int, gender: Optional[str] = None) -> str:
+        rng = self.rng
+        gender = gender or rng.choice("MF")
+        first = rng.choice(FIRST_NAMES_M if gender == "M" else FIRST_NAMES_F)
+        mid = f"{self.id_prefix}{self._next_id}"
+        self._next_id += 1
+        age = max(0, 100 - generation * self.generation_span + rng.randint(-5, 5))
+        self.tree.persons[mid] = Person(mid, f"{first} {rng.choice(SURNAMES)}", gender, age)
+        return mid
+
+    def _link(self, mid1: str, mid2: str, weight: int) -> None:
+        graph = self.tree.graph
+        graph[mid1][mid2] = weight
+        graph[mid2][mid1] = weight
+
+    def _add_child(self, child: str, parents: Tuple[str, ...]) -> None:
+        graph = self.tree.graph
+        for parent in parents:
+            if self.tree.materialize_siblings:
+                for sibling, rel in list(graph[parent].items()):
+                    if rel == 14 and sibling != child:
+                        self._link(child, sibling, 12)
+            graph[child][parent] = 13
+            graph[parent][child] = 14
+
+    def _num_children(self) -> int:
+        # Binomial with mean `fertility`, capped to keep families plausible
+        n = max(1, int(round(self.fertility * 2)))
+        p = self.fertility / n
+        return sum(1 for _ in range(n) if self.rng.random() < p)
+
+    def generate(self, members: int, max_generations: int = 12, founders: Optional[int] = None) -> FamilyTree:
+        """Generate a tree with exactly `members` persons."""
+        rng = self.rng
+        if founders is None:
+            growth = max(1.01, self.fertility * self.marriage_rate)
+            founders = max(1, int(members / (2 * sum(growth ** g for g in range(max_generations)))))
+        couples: List[Tuple[str, ...]] = []
+        for _ in range(founders):
+            if len(self.tree.persons) + 2 > members:
+                break
+            a, b = self._new_person(0, "M"), self._new_person(0, "F")
+            self._link(a, b, 11)
+            couples.append((a, b))
+
+        for generation in range(1, max_generations + 1):
+            if not couples or len(self.tree.persons) >= members:
+                break
+            children: List[str] = []
+            for parents in couples:
+                for _ in range(self._num_children()):
+                    if len(self.tree.persons) >= members:
+                        break
+                    child = self._new_person(generation)
+                    self._add_child(child, parents)
+                    children.append(child)
+
+            next_couples: List[Tuple[str, ...]] = []
+            unmarried = [c for c in children if rng.random() < self.marriage_rate]
+            rng.shuffle(unmarried)
+            taken = set()
+            for person in unmarried:
+                if person in taken:
+                    continue
+                taken.add(person)
+                spouse = None
+                if rng.random() < self.collapse_rate:
+                    for _ in range(8):
+                        candidate = rng.choice(unmarried)
+                        if candidate not in taken and candidate not in self.tree.graph[person]:
+                            spouse = candidate
+                            break
+                if spouse is None:
+                    if len(self.tree.persons) >= members:
+                        continue
+                    spouse = self._new_person(generation)
+                taken.add(spouse)
+                if rng.random() < self.divorce_rate:
+                    self._link(person, spouse, 10)
+                    next_couples.append((person, spouse))
+                    if len(self.tree.persons) < members:
+                        second = self._new_person(generation)
+                        self._link(person, second, 11)
+                        next_couples.append((person, second))
+                else:
+                    self._link(person, spouse, 11)
+                    next_couples.append((person, spouse))
+            couples = next_couples
+
+        # Top up with unrelated founders if the population died out early
+        while len(self.tree.persons) < members:
+            self._new_person(0)
+        return self.tree
+
+
+def generate_pedigree(members: int, seed: int = 0, **options) -> FamilyTree:
+    max_generations = options.pop("max_generations", 12)
+    return PedigreeGenerator(seed=seed, **options).generate(members, max_generations=max_generations)
@@ -0,0 +1,108 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+import pymongo
+
+
+class _MongoClient(mongomock.MongoClient):
+    def __init__(self, *args, event_listeners=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def app_module():
+    real = pymongo.MongoClient
+    pymongo.MongoClient = _MongoClient
+    try:
+        import app
+    finally:
+        pymongo.MongoClient = real
+    app.app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    for name in ("trees", "tree_ops", "tree_checkpoints"):
+        app_module.db[name].delete_many({})
+    for cache in (app_module.user_trees, app_module.user_tree_versions, app_module.tree_oplogs):
+        cache.clear()
+    return app_module.app.test_client()
+
+
+def login(client, username="alice"):
+    token = client.post("/login", json={"username": username, "password": "pw"}).get_json()["access_token"]
+    return {"Authorization": "Bearer " + token}
+
+
+def names(client, headers):
+    return sorted(m["name"] for m in client.get("/members", headers=headers).get_json())
+
+
+@pytest.mark.parametrize("stored", ["json", "snapshot"])
+def test_tree_saved_before_the_op_log_survives_a_reload(app_module, client, stored):
+    from family_tree import Person, FamilyTree
+    import snapshot
+
+    tree = FamilyTree()
+    tree.add_person(Person("a", "Ann", "F", 40))
+    doc = {"username": "alice", "password": "pw"}
+    if stored == "json":
+        tree.add_person(Person("b", "Bo", "M", 12))
+        doc["tree"] = tree.to_dict()
+    else:
+        doc.update(tree_snapshot=snapshot.dumps(tree), tree_version=3)
+    app_module.trees_collection.insert_one(doc)
+    headers = login(client)
+    before = names(client, headers)
+
+    assert client.post("/members", json={"name": "Cy", "age": 5}, headers=headers).status_code == 201
+    assert client.post("/members", json={"name": "Di", "age": 7}, headers=headers).status_code == 201
+    app_module._drop_cached_tree("alice")
+    assert names(client, headers) == sorted(before + ["Cy", "Di"])
+    stored_doc = app_module.trees_collection.find_one({"username": "alice"})
+    assert "tree" not in stored_doc and "checkpoint_version" in stored_doc
+
+
+def test_add_relationship(app_module, client):
+    client.post("/register", json={"username": "alice", "password": "pw"})
+    headers = login(client)
+    a = client.post("/members", json={"name": "Ann", "age": 40}, headers=headers).get_json()["mid"]
+    b = client.post("/members", json={"name": "Bo", "age": 12}, headers=headers).get_json()["mid"]
+    edge = {"from": a, "to": b, "relationship": "Parent"}
+    assert client.post("/relationships", json=edge, headers=headers).status_code == 201
+    assert client.post("/relationships", json=edge, headers=headers).status_code == 400
+    c = client.post("/members", json={"name": "Cy", "age": 9}, headers=headers).get_json()["mid"]
+    unknown = client.post("/relationships", json={"from": a, "to": c, "relationship": "Cousin"}, headers=headers)
+    assert unknown.status_code == 400 and "Cousin" in unknown.get_json()["msg"]
+    assert app_module.user_trees["alice"].graph[b] == {a: 14}
+
+
+def test_relatives_include_derived_siblings(client):
+    client.post("/register", json={"username": "alice", "password": "pw"})
+    headers = login(client)
+    mids = {name: client.post("/members", json={"name": name, "age": 30}, headers=headers).get_json()["mid"]
+            for name in ("Ann", "Bo", "Cy", "Di")}
+    for child in ("Bo", "Cy"):
+        client.post("/relationships", json={"from": mids["Ann"], "to": mids[child], "relationship": "Son-Daughter"},
+                    headers=headers)
+    client.post("/relationships", json={"from": mids["Bo"], "to": mids["Di"], "relationship": "Married"},
+                headers=headers)
+    response = client.get(f"/relatives/{mids['Bo']}", headers=headers)
+    assert response.status_code == 200
+    assert sorted(m["name"] for m in response.get_json()) == ["Ann", "Cy", "Di"]
+    assert client.get("/relatives/nobody", headers=headers).status_code == 404
+
+
+def test_changes_reports_version_and_deltas(app_module, client):
+    client.post("/register", json={"username": "alice", "password": "pw"})
+    headers = login(client)
+    assert client.get("/changes", headers=headers).get_json() == {"version": 0}
+    mid = client.post("/members", json={"name": "Ann", "age": 40}, headers=headers).get_json()["mid"]
+    client.post("/members", json={"name": "Bo", "age": 12}, headers=headers)
+    assert client.get("/changes", headers=headers).get_json() == {"version": 2}
+    delta = client.get("/changes?since=1", headers=headers).get_json()
+    assert delta["version"] == 2 and not delta["reset"]
+    assert [m["name"] for m in delta["members"]] == ["Bo"] and mid not in {m["mid"] for m in delta["members"]}
+    assert client.get("/changes?since=-1", headers=headers).get_json() == {"version": 2, "reset": True}
+    assert client.get("/changes?since=x", headers=headers).status_code == 400
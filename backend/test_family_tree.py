@@ -0,0 +1,116 @@
+import random
+
+import pytest
+
+from family_tree import FamilyTree, Person, TraversalLimits
+from synthetic import generate_pedigree
+
+
+def _build(structure, edges, materialize):
+    tree = FamilyTree()
+    tree.materialize_siblings = materialize
+    for person in structure.persons.values():
+        tree.add_person(Person(person.mid, person.name, person.gender, person.age))
+    for mid1, mid2, label in edges:
+        tree.add_relationship(mid1, mid2, label)
+    return tree
+
+
+@pytest.fixture(params=range(3))
+def tree_pair(request):
+    """One pedigree added edge by edge in shuffled order, siblings materialised and derived."""
+    structure = generate_pedigree(250, seed=request.param)
+    graph = structure.graph
+    edges = []
+    for mid, rels in graph.items():
+        for other, rel in rels.items():
+            if rel == 13:
+                edges.append((mid, other, "Parent"))
+            elif rel in (11, 10) and mid < other:
+                parents = {p for p, r in graph[mid].items() if r == 13}
+                if not parents & {p for p, r in graph[other].items() if r == 13}:
+                    # Siblings who married would already be linked by a materialised Sibling edge
+                    edges.append((mid, other, "Married" if rel == 11 else "Divorced"))
+    random.Random(request.param).shuffle(edges)
+    return _build(structure, edges, True), _build(structure, edges, False)
+
+
+def test_derived_siblings_give_same_labels(tree_pair):
+    materialised, derived = tree_pair
+    assert any(12 in rels.values() for rels in materialised.graph.values())
+    assert not any(12 in rels.values() for rels in derived.graph.values())
+    mids = sorted(materialised.persons)
+    rng = random.Random(3)
+    for _ in range(400):
+        a, b = rng.choice(mids), rng.choice(mids)
+        assert derived.get_relationship_path(a, b) == materialised.get_relationship_path(a, b), (a, b)
+        assert derived.get_relationship_type(a, b) == materialised.get_relationship_type(a, b), (a, b)
+
+
+def test_derived_siblings_give_same_family_queries(tree_pair):
+    materialised, derived = tree_pair
+
+    def mids(people):
+        return sorted(p.mid for p in people)
+
+    for mid in materialised.persons:
+        expected = materialised.get_immediate_family(mid)
+        family = derived.get_immediate_family(mid)
+        assert {k: mids(v) for k, v in family.items()} == {k: mids(v) for k, v in expected.items()}
+        assert mids(derived.get_cousins(mid)) == mids(materialised.get_cousins(mid))
+        assert mids(derived.get_nieces_and_nephews(mid)) == mids(materialised.get_nieces_and_nephews(mid))
+
+
+def _chain(length):
+    """m0 <- m1 <- ... : each member is the parent of the next."""
+    tree = FamilyTree()
+    for i in range(length):
+        tree.add_person(Person(f"m{i}", f"M{i}", "F", 90 - i))
+    for i in range(1, length):
+        tree.graph[f"m{i}"][f"m{i - 1}"] = 13
+        tree.graph[f"m{i - 1}"][f"m{i}"] = 14
+    return tree
+
+
+def test_target_found_within_max_hops_is_not_partial():
+    tree = _chain(3)
+    tree.add_person(Person("s", "Spouse", "M", 60))
+    tree.graph["m0"]["s"] = tree.graph["s"]["m0"] = 11
+    limits = TraversalLimits(max_hops=1)
+    assert tree.get_relationship_path("m0", "s", limits) == [("m0", "s", "Married")]
+    assert not limits.partial and limits.reason is None
+    assert tree.get_generation_gap("m0", "m1", limits) == 1
+    assert not limits.partial
+
+
+def test_target_beyond_max_hops_is_partial():
+    tree = _chain(5)
+    limits = TraversalLimits(max_hops=2)
+    assert tree.get_relationship_path("m0", "m4", limits) is None
+    assert limits.to_dict() == {"partial": True, "reason": "max_hops", "nodes_visited": limits.visited}
+    assert tree.get_relationship_path("m0", "m4", TraversalLimits(max_hops=4)) is not None
+
+
+def test_node_budget_stops_the_search():
+    tree = _chain(50)
+    limits = TraversalLimits(max_nodes=10)
+    assert tree.get_relationship_path("m0", "m49", limits) is None
+    assert limits.partial and limits.reason == "max_nodes" and limits.visited == 11
+
+
+def test_time_budget_stops_the_search():
+    tree = _chain(500)
+    limits = TraversalLimits(time_budget=0.0)
+    assert tree.get_relationship_path("m0", "m499", limits) is None
+    assert limits.partial and limits.reason == "time_budget"
+
+
+def test_common_ancestors_follow_rel_types_and_hops():
+    tree = _chain(4)
+    tree.add_person(Person("x", "Cousin", "M", 10))
+    tree.graph["x"]["m1"], tree.graph["m1"]["x"] = 13, 14
+    assert {p.mid for p in tree.get_common_ancestors("m3", "x")} == {"m0", "m1"}
+    nearest = TraversalLimits(max_hops=1)
+    assert {p.mid for p in tree.get_common_ancestors("m2", "x", nearest)} == {"m1"}
+    assert nearest.partial and nearest.reason == "max_hops"
+    assert tree.get_common_ancestors("m3", "x", TraversalLimits(rel_types={11, 12})) == []
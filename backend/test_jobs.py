@@ -0,0 +1,44 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobPool, PoolBusyError
+
+
+def wait_finished(pool, owner, job_id):
+    for _ in range(200):
+        job = pool.get_job(owner, job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_result_is_released_after_it_is_read():
+    pool = JobPool(max_workers=1)
+    job_id = pool.submit_job("alice", "export", lambda: {"persons": [1, 2, 3]})
+    pool._executor.shutdown(wait=True)
+    job = pool.get_job("alice", job_id)
+    assert job["status"] == "done" and job["result"] == {"persons": [1, 2, 3]}
+    again = pool.get_job("alice", job_id)
+    assert again["status"] == "done" and again["result"] is None and again["collected"]
+    assert pool.get_job("bob", job_id) is None
+
+
+def test_finished_jobs_expire():
+    pool = JobPool(max_workers=1, result_ttl=0.05)
+    job_id = pool.submit_job("alice", "export", lambda: 1)
+    pool._executor.shutdown(wait=True)
+    time.sleep(0.1)
+    assert pool.get_job("alice", job_id) is None
+
+
+def test_busy_pool_rejects_instead_of_queueing():
+    release = threading.Event()
+    pool = JobPool(max_workers=1, max_pending=1)
+    job_id = pool.submit_job("alice", "slow", release.wait)
+    with pytest.raises(PoolBusyError):
+        pool.submit_job("alice", "slow", release.wait)
+    release.set()
+    assert wait_finished(pool, "alice", job_id)["status"] == "done"
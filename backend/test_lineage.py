@@ -0,0 +1,72 @@
+import random
+
+from family_tree import Person, FamilyTree
+from lineage import LineageAggregates
+from synthetic import generate_pedigree
+
+
+def brute_force(tree):
+    """Walk every member's descendants and ancestors directly."""
+    def walk(mid, rel):
+        seen, stack = set(), [mid]
+        while stack:
+            for nxt in tree._get_by_relationship(stack.pop(), rel):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return seen
+
+    def height(mid, rel, memo):
+        if mid not in memo:
+            memo[mid] = max((height(m, rel, memo) + 1 for m in tree._get_by_relationship(mid, rel)), default=0)
+        return memo[mid]
+
+    depths, generations = {}, {}
+    return {mid: {"descendants": len(walk(mid, 14)), "lineage_depth": height(mid, 14, depths),
+                  "generation": height(mid, 13, generations)} for mid in tree.persons}
+
+
+def test_build_matches_brute_force_under_pedigree_collapse():
+    tree = generate_pedigree(1500, seed=3, collapse_rate=0.3)
+    assert tree.get_lineage_aggregates() == brute_force(tree)
+
+
+def test_incremental_updates_match_rebuild():
+    tree = generate_pedigree(1500, seed=3, collapse_rate=0.3)
+    tree.get_lineage_aggregates()
+    rng = random.Random(1)
+    mids = list(tree.persons)
+    for i in range(200):
+        op = rng.random()
+        if op < 0.4:
+            child, parent = rng.choice(mids), rng.choice(mids)
+            if (child != parent and parent not in tree.graph[child] and child not in tree.graph[parent]
+                    and not tree.is_ancestor(child, parent)):
+                tree.add_relationship(child, parent, "Parent")
+        elif op < 0.7:
+            mid = rng.choice(mids)
+            linked = [m for m, rel in tree.graph[mid].items() if rel in (13, 14)]
+            if linked:
+                tree.delete_relationship(mid, rng.choice(linked))
+        elif op < 0.85:
+            mid = f"n{i}"
+            tree.add_person(Person(mid, "New", "M", 1))
+            tree.add_relationship(rng.choice(mids), mid, "Son-Daughter")
+            mids.append(mid)
+        else:
+            mid = rng.choice(mids)
+            tree.delete_person(mid)
+            mids.remove(mid)
+    expected = LineageAggregates.build(tree.graph, tree.persons)
+    assert tree.get_lineage_aggregates() == {mid: expected.get(mid) for mid in tree.persons}
+    assert tree.get_lineage_aggregates() == brute_force(tree)
+
+
+def test_ancestry_cycle_gives_none():
+    tree = FamilyTree()
+    for mid in "abc":
+        tree.add_person(Person(mid, mid.upper(), "F", 30))
+    tree.graph["a"]["b"] = tree.graph["b"]["a"] = 13  # each is the other's parent
+    tree.graph["c"]["a"], tree.graph["a"]["c"] = 13, 14
+    aggregates = tree.get_lineage_aggregates()
+    assert aggregates["a"] == aggregates["c"] == {"descendants": None, "lineage_depth": None, "generation": None}
@@ -0,0 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import SamplingProfiler
+
+
+def _pool_only_work():
+    return sum(i * i for i in range(20000))
+
+
+def test_profile_includes_work_run_on_a_pool_thread():
+    profiler = SamplingProfiler(sample_rate=1.0, slow_seconds=0.0)
+    active = profiler.start()
+    assert active is not None
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pool.submit(profiler.run_in_thread, active, _pool_only_work).result()
+    profiler.stop(active, "GET /slow", 2.0)
+    assert "_pool_only_work" in profiler.reports[-1]["profile"]
+
+
+def test_late_pool_work_stays_out_of_the_next_report():
+    profiler = SamplingProfiler(sample_rate=1.0, slow_seconds=0.0)
+    first = profiler.start()
+    profiler.stop(first, "GET /first", 2.0)
+    second = profiler.start()
+    profiler.run_in_thread(first, _pool_only_work)
+    profiler.stop(second, "GET /second", 2.0)
+    assert "_pool_only_work" not in profiler.reports[-1]["profile"]
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from family_tree import Person, FamilyTree
+from oplog import OpLog, rebuild
+from synthetic import generate_pedigree
+import snapshot
+
+
+def _random_ops(tree, log, rng, count):
+    """Apply a random mix of member and edge edits through the log; returns the states seen."""
+    states = {log.version: tree.to_dict()}
+    for i in range(count):
+        mids = sorted(tree.persons)
+        choice = rng.random()
+        if choice < 0.3:
+            log.apply(tree, "add_person", Person(f"n{i}", f"New {i}", rng.choice("MF"), rng.randint(0, 90)))
+        elif choice < 0.5:
+            log.apply(tree, "edit_person", rng.choice(mids), age=rng.randint(0, 90))
+        elif choice < 0.7:
+            a, b = rng.sample(mids, 2)
+            if b not in tree.graph[a]:
+                log.apply(tree, "add_relationship", a, b, rng.choice(["Married", "Sibling", "Parent"]))
+        elif choice < 0.85:
+            mid = rng.choice(mids)
+            if tree.graph[mid]:
+                log.apply(tree, "delete_relationship", mid, rng.choice(sorted(tree.graph[mid])))
+        elif choice < 0.95:
+            log.apply(tree, "delete_person", rng.choice(mids))
+        elif log.can_undo:
+            log.undo(tree)
+        states[log.version] = tree.to_dict()
+    return states
+
+
+@pytest.fixture
+def history():
+    tree = generate_pedigree(200, seed=5)
+    log = OpLog(0, snapshot.dumps(tree), checkpoint_interval=10, keep_checkpoints=3)
+    states = _random_ops(tree, log, random.Random(5), 60)
+    return tree, log, states
+
+
+def test_replaying_stored_entries_matches_live_tree(history):
+    tree, log, states = history
+    replica = snapshot.loads(log.checkpoints[min(log.checkpoints)])
+    replica_log = OpLog(min(log.checkpoints))
+    for entry in log.entries:
+        if entry["version"] > replica_log.version:
+            replica_log.replay(replica, entry)
+    assert replica.to_dict() == tree.to_dict()
+    assert replica_log.version == log.version
+    # The rebuilt undo stack reverts the same operation as the live one
+    assert log.undo(tree)["target"] == replica_log.undo(replica)["target"]
+    assert replica.to_dict() == tree.to_dict()
+
+
+def test_tree_at_matches_states_seen(history):
+    _, log, states = history
+    oldest = min(log.checkpoints)
+    for version in range(oldest, log.version + 1):
+        assert log.tree_at(version).to_dict() == states[version]
+    with pytest.raises(ValueError):
+        log.tree_at(oldest - 1)
+
+
+def test_rebuild_from_checkpoint_matches_incremental(history):
+    tree, log, _ = history
+    base = max(log.checkpoints)
+    entries = [e for e in log.entries if e["version"] > base]
+    assert rebuild(log.checkpoints[base], entries).to_dict() == tree.to_dict()
+
+
+def test_undo_redo_round_trip():
+    tree = FamilyTree()
+    log = OpLog(0, snapshot.dumps(tree))
+    log.apply(tree, "add_person", Person("a", "Ann", "F", 40))
+    log.apply(tree, "add_person", Person("b", "Bo", "M", 12))
+    before = tree.to_dict()
+    log.apply(tree, "add_relationship", "a", "b", "Son-Daughter")
+    after = tree.to_dict()
+    assert tree.graph["b"]["a"] == 13
+
+    undo = log.undo(tree)
+    assert tree.to_dict() == before and undo["target"] == 3 and log.can_redo
+    log.redo(tree)
+    assert tree.to_dict() == after and not log.can_redo
+    log.undo(tree)
+    log.apply(tree, "edit_person", "b", age=13)
+    assert not log.can_redo  # a new operation discards the redo stack
+    assert log.version == 7
+
+
+def test_failed_operation_is_rolled_back_and_not_logged():
+    tree = FamilyTree()
+    log = OpLog(0, snapshot.dumps(tree))
+    log.apply(tree, "add_person", Person("a", "Ann", "F", 40))
+    log.apply(tree, "add_person", Person("b", "Bo", "M", 12))
+    log.apply(tree, "add_relationship", "a", "b", "Married")
+    before = tree.to_dict()
+    # edit_relationship deletes the edge before failing on the unknown label
+    with pytest.raises(KeyError):
+        log.apply(tree, "edit_relationship", "a", "b", "Cousin")
+    assert tree.to_dict() == before
+    assert log.version == 3
@@ -0,0 +1,30 @@
+from search_index import MemberSearchIndex, normalize
+
+
+def _index():
+    return MemberSearchIndex.build([
+        ("a", "Anna Smith"), ("b", "Mary Annabel"), ("c", "José Anna"), ("d", "Bob"),
+    ])
+
+
+def test_prefix_ranks_exact_then_name_then_word():
+    index = _index()
+    index.add("e", "Anna")
+    assert [mid for mid, _ in index.search("anna", fuzzy=False)] == ["e", "a", "c", "b"]
+
+
+def test_accents_are_ignored():
+    assert normalize("José") == "jose"
+    assert [mid for mid, _ in _index().search("jose", fuzzy=False)] == ["c"]
+
+
+def test_empty_query_matches_nothing():
+    index = _index()
+    assert index.prefix_matches("") == {}
+    assert index.search("   ") == []
+
+
+def test_remove_drops_member():
+    index = _index()
+    index.remove("a")
+    assert "a" not in dict(index.search("anna"))
@@ -0,0 +1,30 @@
+import pytest
+
+from family_tree import Person, FamilyTree
+from synthetic import generate_pedigree
+import snapshot
+
+
+def test_round_trip_matches_to_dict():
+    tree = generate_pedigree(500, seed=1)
+    tree.add_person(Person("x", 'Zoë "Q"\n', "F", None))
+    tree.graph["x"]["p1"] = 11
+    assert snapshot.loads(snapshot.dumps(tree)).to_dict() == tree.to_dict()
+
+
+@pytest.mark.parametrize("age", [30.7, "unknown", 2 ** 40, -(2 ** 31), True])
+def test_ages_outside_i32_are_kept_exactly(age):
+    tree = FamilyTree()
+    tree.add_person(Person("a", "A", "F", age))
+    tree.add_person(Person("b", "B", "M", 41))
+    loaded = snapshot.loads(snapshot.dumps(tree))
+    assert loaded.persons["a"].age == age
+    assert type(loaded.persons["a"].age) is type(age)
+    assert loaded.persons["b"].age == 41
+
+
+def test_corrupt_payload_is_rejected():
+    data = bytearray(snapshot.dumps(generate_pedigree(50, seed=2)))
+    data[-1] ^= 0xFF
+    with pytest.raises(ValueError):
+        snapshot.loads(bytes(data))
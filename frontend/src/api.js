@@ -17,3 +17,39 @@ API.interceptors.request.use((req) => {
 });
 
 export default API;
+
+// Cached copy of the tree kept in sync through /changes so that refetches
+// after an edit only download the members and edges that changed.
+let treeCache = null;
+
+function applyTreeDelta(cache, delta) {
+  const changed = new Set([...delta.members.map(m => m.mid), ...delta.deleted]);
+  const members = cache.members.filter(m => !changed.has(m.mid)).concat(delta.members);
+  const edges = cache.edges.filter(e => !changed.has(e.from)).concat(delta.edges);
+  return { version: delta.version, members, edges };
+}
+
+export async function loadTree() {
+  if (treeCache) {
+    const res = await API.get('/changes', { params: { since: treeCache.version } });
+    if (!res.data.reset) {
+      treeCache = applyTreeDelta(treeCache, res.data);
+      return treeCache;
+    }
+  }
+  // Read the version first: if the tree moves on before the export, the next
+  // delta simply re-sends those members.
+  const { data: head } = await API.get('/changes');
+  const { data: tree } = await API.get('/export_json');
+  treeCache = { version: head.version, members: tree.persons || [], edges: tree.edges || [] };
+  return treeCache;
+}
+
+export function clearTreeCache() {
+  treeCache = null;
+}
+
+// Ranked member search for type-ahead inputs; filters: gender, min_age, max_age, limit
+export function searchMembers(q, filters = {}) {
+  return API.get('/search', { params: { q, ...filters } });
+}
@@ -1,37 +1,23 @@
-import React, { useEffect, useState } from 'react';
+import React, { useState } from 'react';
 import API from '../api';
+import MemberSearch from './MemberSearch';
 
 function KinshipQueries() {
-  const [members, setMembers] = useState([]);
   const [id1, setId1] = useState('');
   const [id2, setId2] = useState('');
+  const [names, setNames] = useState({});
   const [result, setResult] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
 
-  // Fetch members
-  const fetchMembers = async () => {
-    setLoading(true);
-    setError('');
-    try {
-      const res = await API.get('/members');
-      setMembers(res.data);
-    } catch (err) {
-      setError('Failed to load members.');
-    } finally {
-      setLoading(false);
-    }
+  // Remember the names of picked members for the result text
+  const pickMember = (setId) => (mid, member) => {
+    setId(mid);
+    if (member) setNames(prev => ({ ...prev, [mid]: member.name }));
   };
 
-  useEffect(() => {
-    fetchMembers();
-  }, []);
-
   // Helper: get member name by id
-  const getMemberName = (id) => {
-    const m = members.find(x => x.mid === id || x.member_id === id || x.id === id);
-    return m ? m.name : id;
-  };
+  const getMemberName = (id) => names[id] || id;
 
   // Query handler
   const handleRelationshipQuery = async () => {
@@ -117,30 +103,18 @@ function KinshipQueries() {
       <div style={{marginBottom: 24}}>
         <h4 style={{marginBottom: 12, color: '#333'}}>Select Family Members</h4>
         <div style={{display: 'flex', gap: 12, alignItems: 'center', flexWrap: 'wrap'}}>
-          <select 
-            value={id1} 
-            onChange={e => setId1(e.target.value)} 
-            style={{flex: 1, minWidth: 200, padding: 8, borderRadius: 4, border: '1px solid #ddd'}}
-          >
-            <option value="">Select First Member</option>
-            {members.map(m => (
-              <option key={m.mid || m.member_id || m.id} value={m.mid || m.member_id || m.id}>
-                {m.name} ({m.gender}, {m.age})
-              </option>
-            ))}
-          </select>
-          <select 
-            value={id2} 
-            onChange={e => setId2(e.target.value)} 
-            style={{flex: 1, minWidth: 200, padding: 8, borderRadius: 4, border: '1px solid #ddd'}}
-          >
-            <option value="">Select Second Member</option>
-            {members.map(m => (
-              <option key={m.mid || m.member_id || m.id} value={m.mid || m.member_id || m.id}>
-                {m.name} ({m.gender}, {m.age})
-              </option>
-            ))}
-          </select>
+          <MemberSearch
+            value={id1}
+            onChange={pickMember(setId1)}
+            placeholder="Select First Member"
+            style={{flex: 1, minWidth: 200}}
+          />
+          <MemberSearch
+            value={id2}
+            onChange={pickMember(setId2)}
+            placeholder="Select Second Member"
+            style={{flex: 1, minWidth: 200}}
+          />
         </div>
       </div>
 
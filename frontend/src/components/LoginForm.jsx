@@ -1,5 +1,5 @@
 import React, { useState } from 'react';
-import API from '../api';
+import API, { clearTreeCache } from '../api';
 import { useNavigate } from 'react-router-dom';
 
 function LoginForm() {
@@ -23,6 +23,7 @@ function LoginForm() {
       const token = res.data.access_token;
       localStorage.setItem('token', token);
       localStorage.setItem('username', username);
+      clearTreeCache();
       setMessage('Login successful! Redirecting...');
       setMessageType('success');
       setTimeout(() => navigate('/dashboard'), 1000);
@@ -0,0 +1,53 @@
+import React, { useEffect, useState } from 'react';
+import { searchMembers } from '../api';
+
+// Type-ahead member picker backed by /search, so large trees are never
+// downloaded just to fill a dropdown. Calls onChange(mid, member).
+function MemberSearch({ value, onChange, placeholder = 'Select member', required = false, style }) {
+  const [query, setQuery] = useState('');
+  const [options, setOptions] = useState([]);
+
+  useEffect(() => {
+    if (!query.trim()) {
+      setOptions([]);
+      return undefined;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const res = await searchMembers(query, { limit: 20 });
+        if (!cancelled) setOptions(res.data);
+      } catch (err) {
+        if (!cancelled) setOptions([]);
+      }
+    }, 250);
+    return () => { cancelled = true; clearTimeout(timer); };
+  }, [query]);
+
+  return (
+    <div style={{display: 'flex', flexDirection: 'column', gap: 4, ...style}}>
+      <input
+        type="text"
+        value={query}
+        onChange={e => setQuery(e.target.value)}
+        placeholder="Type a name to search"
+        style={{padding: 8, borderRadius: 4, border: '1px solid #ddd'}}
+      />
+      <select
+        value={value}
+        onChange={e => onChange(e.target.value, options.find(m => m.mid === e.target.value) || null)}
+        required={required}
+        style={{padding: 8, borderRadius: 4, border: '1px solid #ddd'}}
+      >
+        <option value="">{placeholder}</option>
+        {options.map(m => (
+          <option key={m.mid} value={m.mid}>
+            {m.name} ({m.gender}, {m.age})
+          </option>
+        ))}
+      </select>
+    </div>
+  );
+}
+
+export default MemberSearch;
@@ -1,5 +1,6 @@
-import React, { useEffect, useState } from 'react';
+import React, { useState } from 'react';
 import API from '../api';
+import MemberSearch from './MemberSearch';
 
 const RELATIONSHIP_TYPES = [
   { label: 'Married', value: 'Married' },
@@ -11,7 +12,6 @@ const RELATIONSHIP_TYPES = [
 
 function MergeTreePanel() {
   const [targetUsername, setTargetUsername] = useState('');
-  const [localMembers, setLocalMembers] = useState([]);
   const [localMemberId, setLocalMemberId] = useState('');
   const [relationship, setRelationship] = useState('Married');
   const [targetMemberId, setTargetMemberId] = useState('');
@@ -22,24 +22,6 @@ function MergeTreePanel() {
   const [loadingTargetMembers, setLoadingTargetMembers] = useState(false);
   const [targetMembersError, setTargetMembersError] = useState('');
 
-  // Fetch local members
-  const fetchLocalMembers = async () => {
-    setLoading(true);
-    setError('');
-    try {
-      const res = await API.get('/members');
-      setLocalMembers(res.data);
-    } catch (err) {
-      setError('Failed to load your members.');
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  useEffect(() => {
-    fetchLocalMembers();
-  }, []);
-
   // Fetch target user's members
   const fetchTargetMembers = async () => {
     setLoadingTargetMembers(true);
@@ -72,8 +54,6 @@ function MergeTreePanel() {
       setMessage(res.data.msg || 'Trees merged successfully!');
       // Save tree after merge
       await API.post('/save_tree');
-      // Refresh local members
-      await fetchLocalMembers();
     } catch (err) {
       setError(err.response?.data?.msg || 'Failed to merge trees.');
     } finally {
@@ -102,17 +82,12 @@ function MergeTreePanel() {
         {targetMembersError && <div style={{color: '#e53935', marginTop: 4}}>{targetMembersError}</div>}
         <label>
           Your Family Member:
-          <select
+          <MemberSearch
             value={localMemberId}
-            onChange={e => setLocalMemberId(e.target.value)}
+            onChange={mid => setLocalMemberId(mid)}
             required
-            style={{width: '100%', marginTop: 4, padding: 8}}
-          >
-            <option value="">Select member</option>
-            {localMembers.map(m => (
-              <option key={m.mid || m.member_id || m.id} value={m.mid || m.member_id || m.id}>{m.name}</option>
-            ))}
-          </select>
+            style={{marginTop: 4}}
+          />
         </label>
         <label>
           Relationship Type:
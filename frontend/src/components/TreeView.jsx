@@ -1,5 +1,5 @@
 import React, { useEffect, useState, useRef } from 'react';
-import API from '../api';
+import { loadTree } from '../api';
 import { flextree } from 'd3-flextree';
 
 function TreeView() {
@@ -16,12 +16,9 @@ function TreeView() {
   const fetchData = async () => {
     setLoading(true);
     try {
-      const [membersRes, relationshipsRes] = await Promise.all([
-        API.get('/members'),
-        API.get('/export_json')
-      ]);
-      setMembers(membersRes.data);
-      setRelationships(relationshipsRes.data.edges || []);
+      const tree = await loadTree();
+      setMembers(tree.members);
+      setRelationships(tree.edges);
       setError('');
     } catch (err) {
       setError('Failed to load family tree data.');